@@ -0,0 +1,168 @@
+"""Headless batch mode for the research pipeline.
+
+Reads topics from a JSONL file (one {"topic": ..., "id": ...} object per line;
+"id" is optional), researches them on a pool of worker processes, and appends
+one JSON line per finished topic to the output file. A topic whose report was
+written while some of its queries failed is recorded as "partial". Re-running
+with the same output file skips topics that completed, and partial or failed
+topics resume from their last checkpointed stage, so an interrupted batch picks
+up where it stopped:
+
+    python batch_research.py topics.jsonl reports.jsonl --workers 4 --max-concurrency 8
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+import tracing  # noqa: E402
+from checkpoints import checkpoint_store  # noqa: E402
+from dedup import DEDUP_THRESHOLD, QUERY_DEDUP_THRESHOLD  # noqa: E402
+from model_backend import BoundedBackend, create_backend  # noqa: E402
+from research_pipeline import EDITOR_MODE, research_topic  # noqa: E402
+from routing import ModelRouter  # noqa: E402
+
+# Model router used by each worker process, set up by _init_worker
+_model = None
+
+
+def read_topics(path):
+    """Parse the input JSONL; topics without an id get one derived from their text."""
+    items = []
+    seen = set()
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"topic": record}
+            if not record.get("topic"):
+                raise ValueError(f"{path}:{line_number}: missing 'topic'")
+            topic_id = str(record.get("id") or hashlib.sha1(record["topic"].encode()).hexdigest()[:12])
+            if topic_id in seen:
+                continue
+            seen.add(topic_id)
+            items.append({"id": topic_id, "topic": record["topic"]})
+    return items
+
+
+def completed_ids(path):
+    """Ids already written to the output with status "done"; partial and failed topics are retried."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            if record.get("status") == "done":
+                done.add(record["id"])
+    return done
+
+
+def _init_worker(semaphore):
+    global _model
+    _model = ModelRouter(factory=lambda model_name: BoundedBackend(create_backend(model_name), semaphore))
+
+
+def _run_topic(item, editor_mode, dedup_threshold, query_threshold, bypass_cache):
+    started = time.perf_counter()
+    with tracing.span("batch_research", trace_id=item["id"], topic=item["topic"]):
+        # Stages finished by an earlier, failed attempt at this topic are reused
+        plan, report, run_stats = research_topic(
+            _model, item["topic"], dedup_threshold=dedup_threshold, bypass_cache=bypass_cache, editor_mode=editor_mode,
+            query_threshold=query_threshold, checkpoint=checkpoint_store.run(f"batch-{item['id']}", item["topic"]),
+        )
+    return {
+        "id": item["id"],
+        "topic": item["topic"],
+        # Failed queries are retried on the next run; the checkpoint keeps the ones that succeeded
+        "status": "partial" if run_stats["queries_failed"] else "done",
+        "plan": plan.model_dump(),
+        "report": report.model_dump(),
+        "stats": run_stats,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file with one topic per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes")
+    parser.add_argument("--max-concurrency", type=int, default=int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8")),
+                        help="Model calls in flight across all workers")
+    parser.add_argument("--editor-mode", choices=["auto", "single", "map_reduce"], default=EDITOR_MODE)
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD, help="Similarity at which summaries and facts are merged")
+    parser.add_argument("--query-dedup-threshold", type=float, default=QUERY_DEDUP_THRESHOLD,
+                        help="Similarity at which search queries are merged")
+    parser.add_argument("--bypass-cache", action="store_true", help="Skip the response cache")
+    args = parser.parse_args(argv)
+
+    items = read_topics(args.input)
+    done = completed_ids(args.output)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} topics, {len(items) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+    if not pending:
+        return
+
+    # Split the per-minute budgets between the workers; each imports rate_limit with these
+    workers = max(1, min(args.workers, len(pending)))
+    os.environ["GEMINI_RPM"] = str(float(os.environ.get("GEMINI_RPM", "60")) / workers)
+    os.environ["GEMINI_TPM"] = str(float(os.environ.get("GEMINI_TPM", "1000000")) / workers)
+
+    # Start the next line cleanly if an interrupted run left a partial one
+    if os.path.exists(args.output) and os.path.getsize(args.output):
+        with open(args.output, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    started = time.perf_counter()
+    failed = partial = 0
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager, open(args.output, "a") as out:
+        if needs_newline:
+            out.write("\n")
+        semaphore = manager.BoundedSemaphore(args.max_concurrency)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(semaphore,)) as pool:
+            futures = {
+                pool.submit(_run_topic, item, args.editor_mode, args.dedup_threshold, args.query_dedup_threshold, args.bypass_cache): item
+                for item in pending
+            }
+            for count, future in enumerate(as_completed(futures), 1):
+                item = futures[future]
+                try:
+                    record = future.result()
+                    partial += record["status"] == "partial"
+                except Exception as e:
+                    failed += 1
+                    record = {"id": item["id"], "topic": item["topic"], "status": "failed", "error": str(e)}
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                print(f"[{count}/{len(pending)}] {record['status']}: {item['topic'][:60]}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(pending) - failed - partial} done, {partial} partial, {failed} failed in {elapsed:.1f}s "
+          f"({len(pending) / elapsed * 60:.1f} topics/min)", file=sys.stderr)
+    if failed or partial:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
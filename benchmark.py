@@ -0,0 +1,191 @@
+"""Offline benchmark for the research pipeline and the task plan/execute flow.
+
+Everything runs headlessly against model_backend.FakeBackend, so no network
+access or API key is needed:
+
+    python benchmark.py --scenario all --concurrency 1,4,8 --runs 16
+    python benchmark.py --scenario research --latency-ms 800 --rate-limit-rate 0.1 --json bench.json
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Keep benchmark runs away from the real cache/task database and out of the
+# shared rate budget; these must be set before the app modules are imported
+_WORKDIR = tempfile.mkdtemp(prefix="agentic-bench-")
+os.environ.setdefault("LLM_CACHE_DISABLED", "1")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_WORKDIR, "llm_cache.sqlite3"))
+os.environ.setdefault("TASK_DB_PATH", os.path.join(_WORKDIR, "tasks.sqlite3"))
+os.environ.setdefault("STATE_DB_PATH", os.path.join(_WORKDIR, "state.sqlite3"))
+os.environ.setdefault("TRACE_PATH", os.path.join(_WORKDIR, "traces.jsonl"))
+os.environ.setdefault("GEMINI_RPM", "1000000")
+os.environ.setdefault("GEMINI_TPM", "1000000000")
+os.environ.setdefault("GEMINI_MAX_CONCURRENCY", "64")
+
+import dedup  # noqa: E402
+import research_pipeline  # noqa: E402
+import task_agents  # noqa: E402
+from model_backend import FakeBackend  # noqa: E402
+from rate_limit import rate_limiter  # noqa: E402
+from task_store import task_store  # noqa: E402
+
+TOPICS = [
+    "What are the best cruise lines in USA for first-time travelers who have never been on a cruise?",
+    "What are the best affordable espresso machines for someone upgrading from a French press?",
+    "What are the best off-the-beaten-path destinations in India for a first-time solo traveler?",
+]
+TEMPLATES = ["Research Brief", "Summarization", "Study Plan"]
+
+
+def run_research_once(model, run_index, queries, editor_mode="auto", dedup_threshold=None):
+    """triage_agent -> research_agent x N -> editor_agent for one topic.
+
+    With `dedup_threshold`, the plan's queries are repeated as-is (as an
+    overlapping plan would) and merged before fan-out, like the app does.
+    """
+    topic = f"{TOPICS[run_index % len(TOPICS)]} (run {run_index})"
+    plan = research_pipeline.triage_agent(model, topic)
+    if dedup_threshold is None:
+        search_queries = [plan.search_queries[i % len(plan.search_queries)] + f" #{i}" for i in range(queries)]
+    else:
+        search_queries = [plan.search_queries[i % len(plan.search_queries)] for i in range(queries)]
+        search_queries, _ = dedup.dedupe_queries(search_queries, dedup_threshold, prompt_for=research_pipeline.research_prompt)
+    summaries = [summary for summary in research_pipeline.run_research_queries(model, search_queries) if summary is not None]
+    if dedup_threshold is not None:
+        summaries, _ = dedup.dedupe_texts(summaries, dedup_threshold)
+    research_pipeline.editor_agent(model, topic, "\n".join(summaries), summaries=summaries, focus_areas=plan.focus_areas, mode=editor_mode)
+
+
+def run_task_once(model, run_index, owner):
+    """Create -> plan -> approve -> execute for one task."""
+    task_id = uuid.uuid4().hex[:8]
+    task_store.create(owner, {
+        "id": task_id,
+        "name": f"Benchmark task {run_index}",
+        "description": f"{TOPICS[run_index % len(TOPICS)]} (run {run_index})",
+        "template": TEMPLATES[run_index % len(TEMPLATES)],
+        "status": "Created",
+        "created_at": datetime.now(),
+    })
+    task_agents.plan_task(model, task_store, task_id)
+    task_store.update(task_id, approved=True, status="Approved")
+    task_agents.run_task(model, task_store, task_id)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(fn, runs, concurrency):
+    """Run `fn(i)` for i in range(runs) with `concurrency` runs in flight.
+
+    Returns:
+        Dict with p50/p95/mean latency, throughput and peak traced memory
+    """
+    latencies = []
+
+    def timed(index):
+        started = time.perf_counter()
+        fn(index)
+        latencies.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(runs)))
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "p50_s": percentile(latencies, 0.50),
+        "p95_s": percentile(latencies, 0.95),
+        "mean_s": statistics.fmean(latencies),
+        "throughput_per_s": runs / wall,
+        "wall_s": wall,
+        "peak_traced_mb": peak / 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["research", "tasks", "all"], default="all")
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--runs", type=int, default=8, help="Pipelines per concurrency level")
+    parser.add_argument("--queries", type=int, default=5, help="research_agent calls per research run")
+    parser.add_argument("--editor-mode", choices=["auto", "single", "map_reduce"], default="auto")
+    parser.add_argument("--dedup-threshold", type=float, help="Merge near-duplicate queries/summaries at this similarity")
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="Median first-token latency")
+    parser.add_argument("--latency-spread", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=250.0)
+    parser.add_argument("--output-tokens", type=int, default=250)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    parser.add_argument("--malformed-json-rate", type=float, default=0.0, help="Fraction of JSON answers corrupted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    model = FakeBackend(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_spread=args.latency_spread,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_json_rate=args.malformed_json_rate,
+        seed=args.seed,
+    )
+    # Injected 429s carry a short retry hint; keep the exponential part small too
+    rate_limiter.base_delay = 0.05
+
+    scenarios = ["research", "tasks"] if args.scenario == "all" else [args.scenario]
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    results = []
+    for scenario in scenarios:
+        for level in levels:
+            if scenario == "research":
+                fn = lambda i: run_research_once(model, i, args.queries, args.editor_mode, args.dedup_threshold)  # noqa: E731
+            else:
+                owner = f"bench-{uuid.uuid4().hex[:8]}"
+                fn = lambda i, owner=owner: run_task_once(model, i, owner)  # noqa: E731
+            calls_before = model.calls
+            result = measure(fn, args.runs, level)
+            result["scenario"] = scenario
+            result["model_calls"] = model.calls - calls_before
+            results.append(result)
+
+    limiter = rate_limiter.stats()
+    print(f"{'scenario':<10}{'conc':>6}{'runs':>6}{'p50 s':>9}{'p95 s':>9}{'runs/s':>9}{'calls':>7}{'peak MB':>9}")
+    for r in results:
+        print(f"{r['scenario']:<10}{r['concurrency']:>6}{r['runs']:>6}{r['p50_s']:>9.2f}{r['p95_s']:>9.2f}"
+              f"{r['throughput_per_s']:>9.2f}{r['model_calls']:>7}{r['peak_traced_mb']:>9.1f}")
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == "darwin" else 1e3)
+    print(f"max RSS {max_rss:.0f} MB · throttled {limiter['throttled']} · retries {limiter['retries']}")
+    dedup_totals = dedup.stats()
+    if args.dedup_threshold is not None:
+        print(f"dedup: {dedup_totals['calls_saved']} calls and ~{dedup_totals['prompt_tokens_saved']} prompt tokens saved")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"args": vars(args), "results": results, "rate_limiter": limiter, "dedup": dedup_totals, "max_rss_mb": max_rss}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from llm import generate_text
+from rate_limit import estimate_tokens
+
+# Compaction kicks in above the high-water mark and folds turns until the
+# verbatim window is back under the low-water mark, so summaries are rare
+HIGH_WATER = 0.8
+LOW_WATER = 0.5
+# Share of the budget the running summary may use
+SUMMARY_SHARE = 0.25
+
+
+class ChatMemory:
+    """Running summary of the chat turns that fell out of the verbatim window.
+
+    Kept in st.session_state next to chat_history; `summarized` is the number of
+    chat_history messages already folded into `summary`.
+    """
+
+    def __init__(self, summary="", summarized=0):
+        self.summary = summary
+        self.summarized = summarized
+
+    def to_dict(self):
+        return {"summary": self.summary, "summarized": self.summarized}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("summary", ""), data.get("summarized", 0))
+
+
+def _is_error(message):
+    return message["role"] == "assistant" and message["content"].startswith("Error:")
+
+
+def _message_tokens(message):
+    return estimate_tokens(message["content"]) + 4
+
+
+def build_chat_contents(history, memory, token_budget):
+    """Build Gemini chat contents from the summary plus the most recent turns.
+
+    Token counts are estimated locally, so building the context never costs an
+    API call. If the verbatim window alone exceeds the budget (e.g. a very long
+    paste), the oldest turns are dropped from this request.
+
+    Args:
+        history: chat_history messages; the last one is the new user prompt
+        memory: ChatMemory for this conversation
+        token_budget: Maximum prompt tokens to send
+
+    Returns:
+        Tuple of (contents, stats) where stats has tokens, recent_messages and
+        summarized_messages
+    """
+    summary_tokens = estimate_tokens(memory.summary) if memory.summary else 0
+    available = token_budget - summary_tokens
+
+    window = []
+    used = 0
+    for message in reversed(history[memory.summarized:]):
+        if _is_error(message):
+            continue
+        cost = _message_tokens(message)
+        # Always send the newest message, even if it alone exceeds the budget
+        if window and used + cost > available:
+            break
+        window.append(message)
+        used += cost
+    window.reverse()
+
+    contents = []
+    if memory.summary:
+        contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{memory.summary}"]})
+        contents.append({"role": "model", "parts": ["Understood, I'll keep that in mind."]})
+    for message in window:
+        role = "model" if message["role"] == "assistant" else "user"
+        # Gemini expects alternating roles; merge consecutive messages from the same side
+        if contents and contents[-1]["role"] == role:
+            contents[-1]["parts"][0] += "\n\n" + message["content"]
+        else:
+            contents.append({"role": role, "parts": [message["content"]]})
+
+    return contents, {
+        "tokens": used + summary_tokens,
+        "recent_messages": len(window),
+        "summarized_messages": memory.summarized,
+    }
+
+
+def compact_chat_memory(model, history, memory, token_budget, min_recent=4):
+    """Fold old turns into the running summary once the verbatim window gets large.
+
+    Call after a reply has been added. Most turns return immediately; when the
+    window passes the high-water mark, one summarization call folds enough of the
+    oldest turns to bring it back under the low-water mark.
+
+    Returns:
+        True if the summary was updated
+    """
+    unsummarized = history[memory.summarized:]
+    window_tokens = sum(_message_tokens(m) for m in unsummarized if not _is_error(m))
+    if window_tokens <= token_budget * HIGH_WATER - (estimate_tokens(memory.summary) if memory.summary else 0):
+        return False
+
+    fold_end = memory.summarized
+    remaining = window_tokens
+    while fold_end < len(history) - min_recent and remaining > token_budget * LOW_WATER:
+        if not _is_error(history[fold_end]):
+            remaining -= _message_tokens(history[fold_end])
+        fold_end += 1
+    if fold_end == memory.summarized:
+        return False
+
+    transcript = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}"
+        for m in history[memory.summarized:fold_end]
+        if not _is_error(m)
+    )
+    max_words = max(50, int(token_budget * SUMMARY_SHARE * 0.75))
+    prompt = f"""You maintain a running summary of a conversation between a user and an AI assistant.
+    Current summary:
+    {memory.summary or "(empty)"}
+
+    New turns to fold into the summary:
+    {transcript}
+
+    Write the updated summary in under {max_words} words. Keep facts, decisions, names, numbers, user preferences and open questions the assistant may need later. Return only the summary.
+    """
+    memory.summary = generate_text(model, prompt, stage="chat.summary").strip()
+    memory.summarized = fold_end
+    return True
@@ -0,0 +1,81 @@
+import hashlib
+import os
+from datetime import datetime
+
+from sqlite_db import SQLiteDatabase, decode_blob, encode_blob
+
+
+class CheckpointStore:
+    """SQLite store for the output of each completed research stage.
+
+    A run is identified by conversation id + topic. Each stage (the plan, one
+    summary per query, the final report) is written as soon as it finishes, so a
+    retried run only re-does the stages that never completed.
+    """
+
+    def __init__(self, path):
+        self.db = SQLiteDatabase(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                run_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                key TEXT NOT NULL DEFAULT '',
+                value TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, stage, key)
+            );
+            """,
+        )
+
+    def run(self, conversation_id, topic):
+        """Checkpoints of one research run: `topic` researched in `conversation_id`."""
+        topic_hash = hashlib.sha1(topic.strip().lower().encode()).hexdigest()[:12]
+        return RunCheckpoint(self, f"{conversation_id}:{topic_hash}")
+
+    def get(self, run_id, stage, key=""):
+        """Return the stored value of a completed stage, or None."""
+        row = self.db.execute(
+            "SELECT value FROM checkpoints WHERE run_id = ? AND stage = ? AND key = ?", (run_id, stage, key)
+        ).fetchone()
+        return decode_blob(row[0]) if row is not None else None
+
+    def put(self, run_id, stage, value, key=""):
+        """Record a completed stage (value must be JSON-serializable; large values are compressed)."""
+        self.db.execute(
+            "INSERT OR REPLACE INTO checkpoints (run_id, stage, key, value, created_at) VALUES (?, ?, ?, ?, ?)",
+            (run_id, stage, key, encode_blob(value), datetime.now().isoformat()),
+        )
+
+    def stages(self, run_id):
+        """List the (stage, key) pairs completed for a run."""
+        rows = self.db.execute(
+            "SELECT stage, key FROM checkpoints WHERE run_id = ? ORDER BY created_at", (run_id,)
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def clear(self, run_id):
+        self.db.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+
+
+class RunCheckpoint:
+    """CheckpointStore bound to one run id."""
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+
+    def get(self, stage, key=""):
+        return self.store.get(self.run_id, stage, key)
+
+    def put(self, stage, value, key=""):
+        self.store.put(self.run_id, stage, value, key)
+
+    def stages(self):
+        return self.store.stages(self.run_id)
+
+    def clear(self):
+        self.store.clear(self.run_id)
+
+
+checkpoint_store = CheckpointStore(os.environ.get("CHECKPOINT_DB_PATH", os.path.join("data", "checkpoints.sqlite3")))
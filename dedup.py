@@ -0,0 +1,169 @@
+import hashlib
+import os
+import random
+import re
+import threading
+
+from rate_limit import estimate_tokens
+
+# Estimated Jaccard similarity at or above which two texts count as duplicates
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.7"))
+# Queries are compared on word shingles with a stricter threshold: one differing
+# key token ("under 200" vs "under 500") makes them different searches
+QUERY_DEDUP_THRESHOLD = float(os.environ.get("QUERY_DEDUP_THRESHOLD", "0.9"))
+DEDUP_NUM_PERM = int(os.environ.get("DEDUP_NUM_PERM", "64"))
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_stats_lock = threading.Lock()
+dedup_stats = {"queries_seen": 0, "queries_merged": 0, "texts_seen": 0, "texts_collapsed": 0,
+               "calls_saved": 0, "prompt_tokens_saved": 0}
+
+
+def _count(**amounts):
+    with _stats_lock:
+        for name, amount in amounts.items():
+            dedup_stats[name] += amount
+
+
+def normalize(text):
+    """Lowercase and collapse punctuation/whitespace so formatting does not affect similarity."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def _hashed(grams):
+    return {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "big") for g in grams}
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Hashed character shingles of the normalized text, for summaries and facts."""
+    text = normalize(text)
+    if len(text) <= size:
+        return _hashed({text})
+    return _hashed({text[i:i + size] for i in range(len(text) - size + 1)})
+
+
+def word_shingles(text):
+    """Hashed words and word pairs of the normalized text, for search queries.
+
+    A query is only a few words long, so every differing word changes a large
+    share of the features; character shingles would mostly still match.
+    """
+    words = normalize(text).split()
+    return _hashed(set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])} or {""})
+
+
+class MinHasher:
+    """MinHash signatures whose agreement rate estimates Jaccard similarity of shingle sets."""
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text, features=shingles):
+        features = features(text)
+        return [min(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for x in features) for a, b in self.permutations]
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+_hasher = MinHasher()
+
+
+class NearDuplicateIndex:
+    """Remembers signatures of kept texts and flags new texts that are near-duplicates.
+
+    Args:
+        threshold: Estimated Jaccard similarity at or above which texts are duplicates
+        hasher: MinHasher to use (a shared default)
+        features: Function turning a text into its shingle set
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, hasher=None, features=shingles):
+        self.threshold = threshold
+        self.hasher = hasher or _hasher
+        self.features = features
+        self.signatures = []
+
+    def _match(self, signature):
+        for position, kept in enumerate(self.signatures):
+            if self.hasher.similarity(signature, kept) >= self.threshold:
+                return position
+        return None
+
+    def find(self, text):
+        """Return the position of the first kept text similar to `text`, or None."""
+        return self._match(self.hasher.signature(text, self.features))
+
+    def add(self, text):
+        """Keep `text` unless it duplicates an earlier one.
+
+        Returns:
+            None if the text was kept, else the position of the text it duplicates
+        """
+        signature = self.hasher.signature(text, self.features)
+        position = self._match(signature)
+        if position is None:
+            self.signatures.append(signature)
+        return position
+
+
+def dedupe_queries(queries, threshold=QUERY_DEDUP_THRESHOLD, prompt_for=None):
+    """Merge near-identical search queries before fan-out.
+
+    Args:
+        queries: Search queries from the research plan
+        threshold: Similarity at or above which queries are merged
+        prompt_for: Optional callable building the research prompt for a query,
+            used to count the prompt tokens a merged query saves
+
+    Returns:
+        Tuple of (unique queries in plan order, report dict with merged pairs,
+        calls_saved and prompt_tokens_saved)
+    """
+    index = NearDuplicateIndex(threshold, features=word_shingles)
+    unique = []
+    merged = []
+    tokens_saved = 0
+    for query in queries:
+        duplicate_of = index.add(query)
+        if duplicate_of is None:
+            unique.append(query)
+        else:
+            merged.append((query, unique[duplicate_of]))
+            tokens_saved += estimate_tokens(prompt_for(query) if prompt_for else query)
+
+    _count(queries_seen=len(queries), queries_merged=len(merged), calls_saved=len(merged), prompt_tokens_saved=tokens_saved)
+    return unique, {"merged": merged, "calls_saved": len(merged), "prompt_tokens_saved": tokens_saved}
+
+
+def dedupe_texts(texts, threshold=DEDUP_THRESHOLD):
+    """Drop texts that repeat an earlier one, e.g. summaries before they reach the editor.
+
+    Returns:
+        Tuple of (kept texts in order, report dict with collapsed count and
+        prompt_tokens_saved)
+    """
+    index = NearDuplicateIndex(threshold)
+    kept = []
+    tokens_saved = 0
+    for text in texts:
+        if index.add(text) is None:
+            kept.append(text)
+        else:
+            tokens_saved += estimate_tokens(text)
+
+    collapsed = len(texts) - len(kept)
+    _count(texts_seen=len(texts), texts_collapsed=collapsed, prompt_tokens_saved=tokens_saved)
+    return kept, {"collapsed": collapsed, "prompt_tokens_saved": tokens_saved}
+
+
+def stats():
+    """Return a snapshot of the process-wide dedup counters."""
+    with _stats_lock:
+        return dict(dedup_stats)
@@ -0,0 +1,165 @@
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+# Width of the hashed embeddings; 256 float32 columns is 1 KB per fact
+FACT_INDEX_DIM = int(os.environ.get("FACT_INDEX_DIM", "256"))
+# Directory for persisted per-conversation indexes; empty keeps them in memory only
+FACT_INDEX_DIR = os.environ.get("FACT_INDEX_DIR", "")
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def _features(text):
+    words = [w for w in _TOKEN_PATTERN.findall(text.lower()) if w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def embed(texts, dim=FACT_INDEX_DIM):
+    """Embed texts locally as L2-normalized, signed feature-hashed bags of words and bigrams.
+
+    Needs no model call, so indexing and retrieval add no API latency or cost.
+
+    Returns:
+        float32 array of shape (len(texts), dim)
+    """
+    rows, cols, signs = [], [], []
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            h = zlib.crc32(feature.encode())
+            rows.append(row)
+            cols.append(h % dim)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    np.add.at(matrix, (rows, cols), signs)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def split_facts(summaries):
+    """Split research summaries into paragraph-sized facts for indexing."""
+    return [part.strip() for summary in summaries for part in re.split(r"\n\s*\n", summary) if part.strip()]
+
+
+class FactIndex:
+    """Append-only fact store with a contiguous embedding matrix and batched cosine top-k.
+
+    Rows live in one preallocated float32 array that doubles when full, so
+    appends are amortized O(1) and a search is a single matrix product.
+    """
+
+    def __init__(self, dim=FACT_INDEX_DIM, capacity=64):
+        self.dim = dim
+        self.texts = []
+        self.metadata = []
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self):
+        return self._vectors[:self._size]
+
+    def _reserve(self, needed):
+        # Memory-mapped arrays are read-only; the first append copies them into memory
+        if needed <= len(self._vectors) and self._vectors.flags.writeable:
+            return
+        grown = np.zeros((max(needed, 2 * len(self._vectors), 64), self.dim), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    def add(self, texts, metadata=None):
+        """Embed and append facts in one batch.
+
+        Args:
+            texts: Fact texts
+            metadata: Optional list of dicts (e.g. source, query) parallel to texts
+        """
+        texts = list(texts)
+        if not texts:
+            return
+        vectors = embed(texts, self.dim)
+        with self._lock:
+            self._reserve(self._size + len(texts))
+            self._vectors[self._size:self._size + len(texts)] = vectors
+            self._size += len(texts)
+            self.texts.extend(texts)
+            self.metadata.extend(metadata or [{} for _ in texts])
+
+    def search(self, queries, k=5, min_score=0.0, where=None):
+        """Find the `k` facts most similar to each query.
+
+        All queries are embedded and scored together in one matrix product.
+
+        Args:
+            queries: Query texts
+            k: Facts per query
+            min_score: Facts scoring this or lower are dropped
+            where: Optional dict; only facts whose metadata has all of these
+                key/value pairs are returned (e.g. {"topic": topic})
+
+        Returns:
+            One list per query of (position, score) pairs, best first
+        """
+        with self._lock:
+            matrix = self._vectors[:self._size]
+            metadata = self.metadata[:self._size]
+        if not len(matrix) or not queries:
+            return [[] for _ in queries]
+        scores = embed(queries, self.dim) @ matrix.T
+        if where:
+            allowed = np.array([all(m.get(key) == value for key, value in where.items()) for m in metadata], dtype=bool)
+            scores[:, ~allowed] = -np.inf
+        k = min(k, len(matrix))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([(int(i), float(scores[row, i])) for i in ordered if scores[row, i] > min_score])
+        return results
+
+    def top_texts(self, queries, k=5, min_score=0.0, where=None):
+        """Like search, but returns fact texts in the order they were added."""
+        return [[self.texts[i] for i, _ in sorted(hits)] for hits in self.search(queries, k, min_score, where)]
+
+    def save(self, directory):
+        """Write vectors.npy and facts.json under `directory`, replacing any earlier copy."""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            vectors = self._vectors[:self._size]
+            facts = {"dim": self.dim, "texts": self.texts[:self._size], "metadata": self.metadata[:self._size]}
+            # Write to temp files first; a reader with the old vectors mapped keeps its copy
+            np.save(os.path.join(directory, "vectors.tmp.npy"), vectors)
+            with open(os.path.join(directory, "facts.json.tmp"), "w") as f:
+                json.dump(facts, f)
+        os.replace(os.path.join(directory, "vectors.tmp.npy"), os.path.join(directory, "vectors.npy"))
+        os.replace(os.path.join(directory, "facts.json.tmp"), os.path.join(directory, "facts.json"))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load an index written by save, memory-mapping the vectors by default.
+
+        Returns an empty index if nothing has been saved in `directory` yet.
+        """
+        facts_path = os.path.join(directory, "facts.json")
+        if not os.path.exists(facts_path):
+            return cls()
+        with open(facts_path) as f:
+            facts = json.load(f)
+        index = cls(dim=facts["dim"], capacity=0)
+        index._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r" if mmap else None)
+        index._size = min(len(facts["texts"]), len(index._vectors))
+        index.texts = facts["texts"]
+        index.metadata = facts["metadata"]
+        return index
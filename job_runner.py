@@ -0,0 +1,194 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """A unit of background work attached to a task id.
+
+    The job keeps only its status; whatever the work produces is written to the
+    task store by the work itself.
+    """
+
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.state = QUEUED
+        self.progress = "Queued"
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    @property
+    def elapsed(self):
+        start = self.started_at or self.submitted_at
+        end = self.finished_at or time.time()
+        return end - start
+
+
+class JobGroup:
+    """Jobs started together by one bulk action, tracked as a whole.
+
+    Holds the Job objects themselves, so progress survives the runner dropping
+    finished jobs from its table.
+
+    Args:
+        kind: Job label shared by the group, e.g. "plan"
+        jobs: List of (name, Job) pairs
+    """
+
+    def __init__(self, kind, jobs):
+        self.kind = kind
+        self.jobs = jobs
+        self.started_at = min((job.submitted_at for _, job in jobs), default=time.time())
+
+    @property
+    def active(self):
+        return any(job.active for _, job in self.jobs)
+
+    def counts(self):
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for _, job in self.jobs:
+            counts[job.state] += 1
+        return counts
+
+    def stats(self):
+        """Aggregate progress: state counts, wall time, tasks/min and speedup over running them one by one."""
+        counts = self.counts()
+        finished = [job for _, job in self.jobs if not job.active]
+        active = len(finished) < len(self.jobs)
+        end = time.time() if active else max((job.finished_at or time.time() for job in finished), default=time.time())
+        wall = end - self.started_at
+        busy = sum(job.elapsed for job in finished if job.started_at)
+        return {
+            **counts,
+            "total": len(self.jobs),
+            "finished": len(finished),
+            "wall_s": wall,
+            "per_minute": len(finished) / wall * 60 if wall > 0 else 0.0,
+            "speedup": busy / wall if wall > 0 and not active else None,
+        }
+
+
+class JobRunner:
+    """Process-wide worker pool with a job table keyed by task id.
+
+    Every Streamlit session submits into the same bounded pool, so concurrent
+    users queue behind each other instead of each holding a server thread for
+    the length of a model call. Each task id has at most one active job.
+    Finished jobs stay in the table for `ttl_seconds` so the session that
+    started them can report the outcome, then they are evicted even if nobody
+    ever looked (bulk runs, abandoned sessions).
+    """
+
+    def __init__(self, max_workers=4, ttl_seconds=3600):
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        # Finished job ids in the order they finished, for TTL eviction
+        self._finished = OrderedDict()
+        self._counts = {QUEUED: 0, RUNNING: 0}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, kind, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)` as the job for `job_id`.
+
+        If the task already has an active job, that job is returned instead of
+        queueing a duplicate.
+
+        Args:
+            job_id: Task id the job belongs to
+            kind: Short job label, e.g. "plan" or "execute"
+            fn: Callable run on a worker thread
+
+        Returns:
+            The Job
+        """
+        with self._lock:
+            self._evict(time.time())
+            existing = self._jobs.get(job_id)
+            if existing is not None and existing.active:
+                return existing
+            self._finished.pop(job_id, None)
+            job = Job(job_id, kind)
+            self._jobs[job_id] = job
+            self._counts[QUEUED] += 1
+            job.future = self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args, kwargs)
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict(time.time())
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        """Drop a finished job from the table."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.active:
+                del self._jobs[job_id]
+                self._finished.pop(job_id, None)
+
+    def queue_depth(self):
+        with self._lock:
+            return self._counts[QUEUED]
+
+    def running_count(self):
+        with self._lock:
+            return self._counts[RUNNING]
+
+    def _evict(self, now):
+        # Caller holds the lock; ids finish in order, so stop at the first one still fresh
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if now - finished_at < self.ttl_seconds:
+                break
+            del self._finished[job_id]
+            del self._jobs[job_id]
+
+    def _set_state(self, job, state):
+        with self._lock:
+            self._counts[job.state] -= 1
+            if state in self._counts:
+                self._counts[state] += 1
+            else:
+                job.finished_at = time.time()
+                self._finished[job.id] = job.finished_at
+            job.state = state
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.time()
+        job.progress = "Running"
+        self._set_state(job, RUNNING)
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            job.error = str(e)
+            job.progress = "Failed"
+            self._set_state(job, FAILED)
+        else:
+            job.progress = "Done"
+            self._set_state(job, DONE)
+
+
+# Sessions submit jobs here and poll their status on later reruns
+job_runner = JobRunner(
+    max_workers=int(os.environ.get("JOB_WORKERS", "4")),
+    ttl_seconds=float(os.environ.get("JOB_TTL", "3600")),
+)
@@ -0,0 +1,200 @@
+import os
+import time
+
+import routing
+import tracing
+from llm_cache import ResponseCache, make_cache_key
+from rate_limit import DEFAULT_OUTPUT_TOKENS, estimate_tokens, rate_limiter, usage_tokens
+from streaming import stream_text
+
+# One cache per process, shared by every Streamlit session (and every process
+# pointed at the same SQLite file)
+response_cache = ResponseCache(
+    os.environ.get("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3")),
+    max_memory_entries=int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "512")),
+    max_disk_entries=int(os.environ.get("LLM_CACHE_DISK_ENTRIES", "5000")),
+    ttl_seconds=float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+)
+CACHE_ENABLED = os.environ.get("LLM_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def _model_name(model):
+    return getattr(model, "model_name", None) or type(model).__name__
+
+
+def _usage_attrs(response):
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(metadata, "prompt_token_count", None),
+        "output_tokens": getattr(metadata, "candidates_token_count", None),
+        "total_tokens": getattr(metadata, "total_token_count", None),
+    }
+
+
+def generate_text(model, prompt, generation_config=None, request_options=None, bypass_cache=False, max_age=None, stage="llm", deadline=None):
+    """Generate a completion through the response cache.
+
+    If `model` is a ModelRouter the stage's route picks the model. On a cascade
+    route a cheaper model's answer that errors or is too short is escalated to
+    the next model.
+
+    Args:
+        model: Model (or ModelRouter) used on a cache miss
+        prompt: Prompt string or list of chat contents
+        generation_config: Optional generation config; part of the cache key
+        request_options: Optional request options (timeouts); not part of the key
+        bypass_cache: Skip the cache lookup and store for this call
+        max_age: Optional per-call freshness limit in seconds
+        stage: Span name for tracing, e.g. "triage" or "research[2]"
+        deadline: Optional time.monotonic() value by which the whole call must
+            finish, every cascade tier and rate-limit retry included; each
+            request's timeout is cut to the time left, and once it runs out the
+            call raises TimeoutError instead of trying again
+
+    Returns:
+        The response text
+    """
+    route, tiers = routing.resolve(model, stage)
+    if route is None:
+        return _generate_text(model, prompt, generation_config, request_options, bypass_cache, max_age, stage, deadline)
+    with routing.decision(route, stage) as decision:
+        for i, tier in enumerate(tiers):
+            decision.use(tier)
+            last = i == len(tiers) - 1
+            try:
+                text = _generate_text(tier, prompt, generation_config, request_options, bypass_cache, max_age, stage, deadline)
+            except Exception as e:
+                if last or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+                decision.escalate(f"error {type(e).__name__}")
+                continue
+            if last or route.acceptable(text) or (deadline is not None and time.monotonic() >= deadline):
+                return text
+            decision.escalate("low quality")
+
+
+def _request_options(request_options, deadline, stage):
+    """Request options with the timeout cut to the time left before `deadline`."""
+    if deadline is None:
+        return request_options
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"{stage} ran out of time")
+    timeout = (request_options or {}).get("timeout")
+    return {**(request_options or {}), "timeout": min(timeout, remaining) if timeout else remaining}
+
+
+def _generate_text(model, prompt, generation_config, request_options, bypass_cache, max_age, stage, deadline=None):
+    with tracing.span(stage, kind="llm", model=_model_name(model), prompt_chars=len(str(prompt))) as call:
+        use_cache = CACHE_ENABLED and not bypass_cache
+        if not use_cache:
+            response_cache.record_bypass()
+        else:
+            key = make_cache_key(_model_name(model), prompt, generation_config)
+            cached = response_cache.get(key, max_age=max_age)
+            if cached is not None:
+                call.set(cache_hit=True, response_chars=len(cached), retries=0)
+                return cached
+
+        retries = []
+        response = rate_limiter.call(
+            lambda: model.generate_content(
+                prompt, generation_config=generation_config, request_options=_request_options(request_options, deadline, stage)
+            ),
+            estimate_tokens(prompt) + DEFAULT_OUTPUT_TOKENS,
+            usage=usage_tokens,
+            on_retry=lambda: retries.append(1),
+            deadline=deadline,
+        )
+        text = response.text
+        call.set(cache_hit=False, response_chars=len(text), retries=len(retries), **_usage_attrs(response))
+        if use_cache:
+            response_cache.put(key, _model_name(model), text)
+        return text
+
+
+def invalidate(model, prompt, generation_config=None, stage="llm"):
+    """Remove the cached response for a request so the next call goes to the model."""
+    for tier in routing.resolve(model, stage)[1]:
+        response_cache.delete(make_cache_key(_model_name(tier), prompt, generation_config))
+
+
+def generate_stream(model, prompt, generation_config=None, timer=None, bypass_cache=False, stage="llm"):
+    """Stream a completion through the response cache.
+
+    A cache hit is yielded as a single chunk. On a miss the chunks are passed
+    through as they arrive and the full text is stored once the stream completes.
+    A routed stream uses its route's first model: text already shown cannot be
+    escalated.
+
+    Args:
+        model: Model (or ModelRouter) used on a cache miss
+        prompt: Prompt string or list of chat contents
+        generation_config: Optional generation config; part of the cache key
+        timer: Optional StreamTimer updated as chunks arrive
+        bypass_cache: Skip the cache lookup and store for this call
+        stage: Span name for tracing
+
+    Yields:
+        Text chunks
+    """
+    route, tiers = routing.resolve(model, stage)
+    model = tiers[0]
+    decision = routing.Decision(route, stage) if route is not None else None
+    if decision is not None:
+        decision.use(model)
+    # Not a `with` span: the generator yields back to the caller between chunks
+    call = tracing.start_span(stage, kind="llm", stream=True, model=_model_name(model), prompt_chars=len(str(prompt)))
+    started = time.perf_counter()
+    error = None
+    try:
+        use_cache = CACHE_ENABLED and not bypass_cache
+        if not use_cache:
+            response_cache.record_bypass()
+        else:
+            key = make_cache_key(_model_name(model), prompt, generation_config)
+            cached = response_cache.get(key)
+            if cached is not None:
+                if timer:
+                    timer.mark_token()
+                    timer.stop()
+                call.set(cache_hit=True, response_chars=len(cached), retries=0, ttft=time.perf_counter() - started)
+                yield cached
+                return
+
+        estimated = estimate_tokens(prompt) + DEFAULT_OUTPUT_TOKENS
+        attempt = 0
+        while True:
+            chunks = []
+            try:
+                with rate_limiter.slot(estimated) as permit:
+                    response = model.generate_content(prompt, generation_config=generation_config, stream=True)
+                    for chunk in stream_text(response, timer):
+                        if not chunks:
+                            call.set(ttft=time.perf_counter() - started)
+                        chunks.append(chunk)
+                        yield chunk
+                    permit["usage"] = usage_tokens(response)
+                break
+            except Exception as e:
+                # Only retry if nothing has been shown yet; a half-rendered answer cannot be replayed
+                if chunks or not rate_limiter.should_retry(e, attempt):
+                    raise
+                rate_limiter.backoff(e, attempt)
+                attempt += 1
+        text = "".join(chunks)
+        call.set(cache_hit=False, response_chars=len(text), retries=attempt, **_usage_attrs(response))
+        if use_cache:
+            response_cache.put(key, _model_name(model), text)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if decision is not None:
+            decision.failed = error is not None
+            attrs = decision.attrs()
+            call.set(route=route.name, slo_ms=attrs["slo_ms"], slo_met=attrs["slo_met"])
+            routing.record(route, attrs)
+        call.end(error=error)
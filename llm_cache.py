@@ -0,0 +1,182 @@
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _to_jsonable(value):
+    """Fallback serializer for generation configs (dataclasses, pydantic schemas, protos)."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, "model_json_schema"):
+        # Pydantic response schemas: key on the schema itself so edits to the model invalidate entries
+        return value.model_json_schema()
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    return repr(value)
+
+
+def make_cache_key(model_name, prompt, generation_config=None):
+    """Build a content-addressed key from the model name, prompt, and generation config.
+
+    Args:
+        model_name: Name of the model that serves the call
+        prompt: Prompt string or list of chat contents
+        generation_config: Optional generation config (dict or GenerationConfig)
+
+    Returns:
+        Hex SHA-256 digest identifying the request
+    """
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "config": generation_config},
+        sort_keys=True,
+        default=_to_jsonable,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier LLM response cache: an in-process LRU in front of a SQLite table.
+
+    The memory tier holds the most recently used responses for this process; the
+    SQLite tier survives restarts and is shared by every process pointed at the same
+    file. Entries expire after `ttl_seconds` and the disk tier is trimmed to
+    `max_disk_entries` by least recent access. Memory hits write their access
+    time back to disk at most once per `touch_interval` seconds per key, so
+    entries that are popular in memory are not the first ones trimmed from disk.
+    """
+
+    def __init__(self, path, max_memory_entries=512, max_disk_entries=5000, ttl_seconds=7 * 24 * 3600, touch_interval=60):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.touch_interval = touch_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts_since_trim = 0
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "writes": 0, "evictions": 0, "bypassed": 0}
+
+        self._conn = None
+
+    def _connection(self):
+        # Opened on first use so importing llm does not create the cache file; callers hold the lock
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key, max_age=None):
+        """Return the cached response for `key`, or None on a miss.
+
+        Args:
+            key: Key built by make_cache_key
+            max_age: Optional per-call freshness limit in seconds, tighter than the TTL
+        """
+        now = time.time()
+        oldest = now - min(self.ttl_seconds, max_age if max_age is not None else self.ttl_seconds)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] >= oldest:
+                self._memory.move_to_end(key)
+                if now - entry[2] >= self.touch_interval:
+                    self._connection().execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._memory[key] = (entry[0], entry[1], now)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return entry[0]
+
+            row = self._connection().execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < oldest:
+                if row is not None and row[1] < now - self.ttl_seconds:
+                    self._connection().execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._stats["misses"] += 1
+                return None
+
+            self._connection().execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._remember(key, row[0], row[1], now)
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            return row[0]
+
+    def put(self, key, model_name, response):
+        """Store a response in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now, now)
+            self._connection().execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now),
+            )
+            self._stats["writes"] += 1
+            self._puts_since_trim += 1
+            # Trimming scans the index, so only do it every so often
+            if self._puts_since_trim >= max(1, self.max_disk_entries // 20):
+                self._trim_disk(now)
+
+    def delete(self, key):
+        """Drop an entry from both tiers (e.g. a response that failed validation)."""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._connection().execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def stats(self):
+        """Return a snapshot of the hit/miss counters and tier sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._connection().execute("DELETE FROM responses")
+
+    def _remember(self, key, response, created_at, touched_at):
+        # touched_at: when accessed_at was last written to disk for this key
+        self._memory[key] = (response, created_at, touched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self, now):
+        self._puts_since_trim = 0
+        expired = self._connection().execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_disk_entries
+        if overflow > 0:
+            self._connection().execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+        self._stats["evictions"] += expired + max(0, overflow)
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+# Words used to build deterministic filler text for the fake backend
+_WORDS = (
+    "research market analysis data trend growth user travel price quality service option budget "
+    "review feature experience cost value benefit risk plan source study result summary key point"
+).split()
+
+
+class ModelBackend:
+    """Interface every model backend implements.
+
+    It mirrors `GenerativeModel.generate_content`, so `model` in both apps (and
+    llm.py, which is the only caller) works with any backend.
+    """
+
+    model_name = None
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        raise NotImplementedError
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini through google-generativeai.
+
+    The SDK takes over a second to import, so it is only imported (and the
+    client configured) on the first call rather than when the app starts.
+    """
+
+    def __init__(self, model_name, api_key=None):
+        self._api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+        # Same name the SDK reports, so cache keys do not depend on whether the client exists yet
+        self.model_name = model_name if "/" in model_name else f"models/{model_name}"
+
+    def _client(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=self._api_key or os.environ.get("GOOGLE_API_KEY"))
+                self._model = genai.GenerativeModel(self.model_name)
+            return self._model
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        return self._client().generate_content(
+            prompt, generation_config=generation_config, stream=stream, request_options=request_options
+        )
+
+
+class FakeRateLimitError(Exception):
+    """Stand-in for the 429 ResourceExhausted error raised by the Gemini client."""
+
+    code = 429
+
+
+class FakeResponse:
+    """Minimal response object with the attributes llm.py reads."""
+
+    def __init__(self, text, chunks=None, usage_metadata=None, chunk_delay=0.0):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self._chunks = chunks or [text]
+        self._chunk_delay = chunk_delay
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                time.sleep(self._chunk_delay)
+            yield SimpleNamespace(text=chunk)
+
+
+class FakeBackend(ModelBackend):
+    """Deterministic offline backend for benchmarks and development without an API key.
+
+    Latency is first-token delay (drawn from the configured distribution) plus
+    output tokens divided by `tokens_per_second`. Output is derived from a hash
+    of the prompt, so the same prompt always gets the same answer; JSON schemas
+    in the generation config are honoured. A fraction of calls can be made to
+    fail with a 429 or to return malformed (fenced / truncated) JSON.
+
+    Args:
+        model_name: Name reported to the cache and traces
+        latency: "fixed", "uniform" or "lognormal" first-token latency distribution
+        latency_ms: Median first-token latency in milliseconds
+        latency_spread: Spread of the distribution (uniform: +/- fraction, lognormal: sigma)
+        tokens_per_second: Output generation rate
+        output_tokens: Length of free-text answers in tokens
+        rate_limit_rate: Probability of raising a 429
+        malformed_json_rate: Probability of corrupting a JSON answer
+        seed: Seed for the random draws
+    """
+
+    def __init__(self, model_name="fake-gemini", latency="lognormal", latency_ms=400.0, latency_spread=0.5,
+                 tokens_per_second=250.0, output_tokens=250, rate_limit_rate=0.0, malformed_json_rate=0.0, seed=0):
+        self.model_name = model_name
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_spread = latency_spread
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_json_rate = malformed_json_rate
+        self.seed = seed
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _rng(self, prompt_hash):
+        # One stream of draws per prompt and attempt, so concurrency does not change outcomes
+        with self._lock:
+            attempt = self._attempts.get(prompt_hash, 0)
+            self._attempts[prompt_hash] = attempt + 1
+            self.calls += 1
+        return random.Random(f"{self.seed}:{prompt_hash}:{attempt}")
+
+    def _first_token_delay(self, rng):
+        median = self.latency_ms / 1000.0
+        if self.latency == "fixed":
+            return median
+        if self.latency == "uniform":
+            return rng.uniform(median * (1 - self.latency_spread), median * (1 + self.latency_spread))
+        return median * math.exp(rng.gauss(0, self.latency_spread))
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        prompt_text = prompt if isinstance(prompt, str) else json.dumps(prompt, default=str)
+        prompt_hash = hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+        rng = self._rng(prompt_hash)
+
+        first_token = self._first_token_delay(rng)
+        if rng.random() < self.rate_limit_rate:
+            time.sleep(first_token / 4)
+            raise FakeRateLimitError("429 Resource has been exhausted (e.g. check quota). Please retry in 0.2s")
+
+        schema = (generation_config or {}).get("response_schema") if isinstance(generation_config, dict) else None
+        if schema is not None:
+            schema = schema.model_json_schema() if hasattr(schema, "model_json_schema") else schema
+            text = json.dumps(_fake_value(schema, rng, self.output_tokens, schema))
+            if rng.random() < self.malformed_json_rate:
+                text = _corrupt_json(text, rng)
+        else:
+            text = _filler(rng, self.output_tokens)
+
+        # Roughly 4 characters per token, matching rate_limit.estimate_tokens
+        output_tokens = max(1, len(text) // 4)
+        prompt_tokens = max(1, len(prompt_text) // 4)
+        usage = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+        generation_time = output_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+        if not stream:
+            time.sleep(first_token + generation_time)
+            return FakeResponse(text, usage_metadata=usage)
+
+        time.sleep(first_token)
+        chunk_size = 80
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        return FakeResponse(text, chunks=chunks, usage_metadata=usage, chunk_delay=generation_time / len(chunks))
+
+
+def _filler(rng, tokens):
+    words = [rng.choice(_WORDS) for _ in range(max(1, int(tokens * 0.75)))]
+    sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+    return " ".join(sentences)
+
+
+def _resolve(schema, root=None):
+    root = root or schema
+    if "$ref" in schema:
+        name = schema["$ref"].split("/")[-1]
+        return root.get("$defs", {}).get(name, {})
+    return schema
+
+
+def _fake_value(schema, rng, output_tokens, root, name=""):
+    schema = _resolve(schema, root)
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            key: _fake_value(value, rng, output_tokens, root, key)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [_fake_value(schema.get("items", {}), rng, output_tokens, root, name) for _ in range(rng.randint(3, 5))]
+    if kind == "integer":
+        return rng.randint(100, 2000)
+    if kind == "number":
+        return round(rng.uniform(0, 1), 3)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    # Long-form fields get a full answer, everything else a short phrase
+    if name in ("report", "plan", "summary", "content"):
+        return _filler(rng, output_tokens)
+    return _filler(rng, 8).rstrip(".")
+
+
+def _corrupt_json(text, rng):
+    kind = rng.choice(("fenced", "trailing", "truncated"))
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "trailing":
+        return f"{text}\n\nLet me know if you need anything else!"
+    return text[: len(text) // 2]
+
+
+class BoundedBackend(ModelBackend):
+    """Wraps a backend so that calls from several processes share one concurrency limit.
+
+    `semaphore` is anything with acquire/release, e.g. a multiprocessing
+    Manager().BoundedSemaphore handed to every worker of the batch CLI. The
+    per-process rate limiter still applies on top. A streaming call holds its
+    slot only while the request is made, not while the stream is read.
+    """
+
+    def __init__(self, backend, semaphore):
+        self.backend = backend
+        self.semaphore = semaphore
+        self.model_name = backend.model_name
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        self.semaphore.acquire()
+        try:
+            return self.backend.generate_content(
+                prompt, generation_config=generation_config, stream=stream, request_options=request_options
+            )
+        finally:
+            self.semaphore.release()
+
+
+def create_backend(model_name, api_key=None):
+    """Build the backend selected by MODEL_BACKEND ("gemini" by default, or "fake").
+
+    The fake backend reads FAKE_LATENCY_MS, FAKE_TOKENS_PER_SECOND,
+    FAKE_RATE_LIMIT_RATE and FAKE_MALFORMED_JSON_RATE.
+    """
+    if os.environ.get("MODEL_BACKEND", "gemini").lower() == "fake":
+        return FakeBackend(
+            model_name=f"fake-{model_name}",
+            latency_ms=float(os.environ.get("FAKE_LATENCY_MS", "400")),
+            tokens_per_second=float(os.environ.get("FAKE_TOKENS_PER_SECOND", "250")),
+            rate_limit_rate=float(os.environ.get("FAKE_RATE_LIMIT_RATE", "0")),
+            malformed_json_rate=float(os.environ.get("FAKE_MALFORMED_JSON_RATE", "0")),
+        )
+    return GeminiBackend(model_name, api_key=api_key)
+
+
+def uses_fake_backend():
+    return os.environ.get("MODEL_BACKEND", "gemini").lower() == "fake"
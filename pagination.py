@@ -0,0 +1,60 @@
+"""Paging helpers for long lists in the Streamlit apps.
+
+Lists drawn with these helpers only render one page (or the latest window) of
+items, so a rerun costs the same however long the list grows. The controls
+change session state from button callbacks; inside an st.fragment a click then
+reruns just that fragment.
+"""
+import streamlit as st
+
+
+def page_bounds(total, page_size, page):
+    """Clamp `page` to the list and return (page, page_count, start, end)."""
+    page_count = max(1, -(-total // page_size))
+    page = min(max(page, 0), page_count - 1)
+    return page, page_count, page * page_size, min(total, (page + 1) * page_size)
+
+
+def _step(state_key, step):
+    st.session_state[state_key] += step
+
+
+def pager(state_key, total, page_size):
+    """Draw ‹ Page n of m › controls for a list of `total` items.
+
+    Args:
+        state_key: Session state key holding the current page number
+        total: Number of items in the list
+        page_size: Items per page
+
+    Returns:
+        (start, end) slice of the items on the current page
+    """
+    page, page_count, start, end = page_bounds(total, page_size, st.session_state.get(state_key, 0))
+    st.session_state[state_key] = page
+    if page_count > 1:
+        prev_col, page_col, next_col = st.columns([1, 2, 1])
+        prev_col.button("‹", key=f"{state_key}_prev", disabled=page == 0, on_click=_step, args=(state_key, -1))
+        page_col.caption(f"Page {page + 1} of {page_count}")
+        next_col.button("›", key=f"{state_key}_next", disabled=page >= page_count - 1, on_click=_step, args=(state_key, 1))
+    return start, end
+
+
+def tail_window(state_key, total, window, noun="items"):
+    """Show only the newest items, with a button that reveals `window` older ones at a time.
+
+    Args:
+        state_key: Session state key holding how many items are shown
+        total: Number of items in the list
+        window: Items shown at first and added per click
+        noun: What the items are called on the button
+
+    Returns:
+        Index of the first item to draw
+    """
+    shown = st.session_state.setdefault(state_key, window)
+    start = max(0, total - shown)
+    if start:
+        st.button(f"Show {min(start, window)} earlier {noun}", key=f"{state_key}_more",
+                  on_click=_step, args=(state_key, window))
+    return start
@@ -0,0 +1,221 @@
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Rough output allowance charged up front; corrected from usage_metadata afterwards
+DEFAULT_OUTPUT_TOKENS = 512
+
+_RETRY_HINT_PATTERNS = (
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry[- ]after:?\s*([\d.]+)", re.IGNORECASE),
+)
+
+
+def is_rate_limit_error(error):
+    """True for 429 / quota / resource-exhausted errors from the Gemini client."""
+    code = getattr(error, "code", None)
+    if code == 429 or getattr(code, "value", None) == 429:
+        return True
+    text = str(error).lower()
+    return "429" in text or "quota" in text or "resource exhausted" in text or "resource_exhausted" in text
+
+
+def retry_hint(error):
+    """Seconds the server asked us to wait before retrying, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers and headers.get("Retry-After"):
+        try:
+            return float(headers["Retry-After"])
+        except ValueError:
+            pass
+    text = str(error)
+    for pattern in _RETRY_HINT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def estimate_tokens(prompt):
+    """Cheap local token estimate (~4 characters per token)."""
+    return max(1, len(str(prompt)) // 4)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._level = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Take `amount` units and return how long the caller must wait for them."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._level -= min(amount, self.capacity)
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def adjust(self, amount):
+        """Charge (positive) or refund (negative) units after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level - amount)
+
+
+class RateLimiter:
+    """Process-wide limiter in front of every model call.
+
+    Combines a requests-per-minute and a tokens-per-minute bucket with an AIMD
+    concurrency window: each throttle halves the number of calls allowed in
+    flight, each success grows it back by roughly one call per window. Rate-limit
+    errors are retried with jittered exponential backoff, never shorter than the
+    server's retry hint.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrency, max_retries=5, base_delay=1.0, max_delay=60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self._stats = {"calls": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+
+    @contextmanager
+    def slot(self, estimated_tokens):
+        """Hold one concurrency slot and the rate budget for a single model call.
+
+        Yields a dict; set `usage` to the call's actual token count so the
+        tokens-per-minute bucket can be corrected. Callers waiting on the rate
+        budget or for a slot count as queued; the budget is waited for first,
+        so a sleeping caller does not hold a slot another call could use.
+        """
+        started = time.monotonic()
+        with self._condition:
+            self._waiting += 1
+        try:
+            delay = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+            if delay > 0:
+                time.sleep(delay)
+            with self._condition:
+                while self._in_flight >= max(1, int(self._limit)):
+                    self._condition.wait()
+                self._in_flight += 1
+        finally:
+            with self._condition:
+                self._waiting -= 1
+        try:
+            with self._condition:
+                self._stats["calls"] += 1
+                self._stats["wait_seconds"] += time.monotonic() - started
+            permit = {"usage": None}
+            yield permit
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self._on_throttle()
+            raise
+        else:
+            self._on_success()
+            if permit["usage"]:
+                self.tokens.adjust(permit["usage"] - estimated_tokens)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def should_retry(self, error, attempt):
+        return attempt < self.max_retries and is_rate_limit_error(error)
+
+    def backoff(self, error, attempt, deadline=None):
+        """Sleep before retry number `attempt + 1` (never past `deadline`) and return the delay used."""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        hint = retry_hint(error)
+        if hint is not None:
+            delay = max(delay, hint)
+        if deadline is not None:
+            delay = max(0.0, min(delay, deadline - time.monotonic()))
+        with self._condition:
+            self._stats["retries"] += 1
+            self._stats["wait_seconds"] += delay
+        time.sleep(delay)
+        return delay
+
+    def call(self, fn, estimated_tokens, usage=None, on_retry=None, deadline=None):
+        """Run `fn()` under the limiter, retrying rate-limit errors.
+
+        Args:
+            fn: Zero-argument callable making one model call
+            estimated_tokens: Tokens charged to the budget before the call
+            usage: Optional callable(result) -> actual token count or None
+            on_retry: Optional callable() invoked before each retry
+            deadline: Optional time.monotonic() value after which errors are no longer retried
+
+        Returns:
+            Whatever fn returns
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.slot(estimated_tokens) as permit:
+                    result = fn()
+                    if usage:
+                        permit["usage"] = usage(result)
+                return result
+            except Exception as e:
+                if not self.should_retry(e, attempt) or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+                if on_retry:
+                    on_retry()
+                self.backoff(e, attempt, deadline)
+                attempt += 1
+
+    def _on_throttle(self):
+        with self._condition:
+            self._stats["throttled"] += 1
+            self._limit = max(1.0, self._limit / 2)
+
+    def _on_success(self):
+        with self._condition:
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            self._condition.notify_all()
+
+    def stats(self):
+        """Snapshot of queue depth, concurrency window and throttle counters."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats["queue_depth"] = self._waiting
+            stats["in_flight"] = self._in_flight
+            stats["concurrency_limit"] = int(self._limit)
+        return stats
+
+
+def usage_tokens(response):
+    """Total token count from a response's usage_metadata, if present."""
+    metadata = getattr(response, "usage_metadata", None)
+    return getattr(metadata, "total_token_count", None) or None
+
+
+# The Gemini quota is per API key, so all sessions and worker threads draw from one limiter
+rate_limiter = RateLimiter(
+    requests_per_minute=float(os.environ.get("GEMINI_RPM", "60")),
+    tokens_per_minute=float(os.environ.get("GEMINI_TPM", "1000000")),
+    max_concurrency=int(os.environ.get("GEMINI_MAX_CONCURRENCY", "8")),
+    max_retries=int(os.environ.get("GEMINI_MAX_RETRIES", "5")),
+)
@@ -0,0 +1,131 @@
+"""Measure how long a Streamlit rerun of each app takes.
+
+Every widget interaction re-executes the whole app script, so this is the
+latency a user feels on each click. Each app is run headlessly with
+streamlit.testing's AppTest: one cold run, then --reruns reruns without model
+calls. --clear-resources empties st.cache_resource before every rerun, which
+shows what rebuilding the shared resources on each interaction would cost:
+
+    python rerun_benchmark.py --reruns 50
+    python rerun_benchmark.py --app agentic_ai_assist.py --clear-resources
+
+--history seeds each session with that many chat messages, tasks (assistant
+app) or collected facts (research app) before measuring, to check that rerun
+time stays flat as a session grows:
+
+    python rerun_benchmark.py --history 0,100,1000,5000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+# Keep runs away from the real cache/task database; set before the apps import them
+_WORKDIR = tempfile.mkdtemp(prefix="agentic-rerun-bench-")
+os.environ.setdefault("MODEL_BACKEND", "fake")
+os.environ.setdefault("GOOGLE_API_KEY", "rerun-benchmark")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_WORKDIR, "llm_cache.sqlite3"))
+os.environ.setdefault("TASK_DB_PATH", os.path.join(_WORKDIR, "tasks.sqlite3"))
+os.environ.setdefault("STATE_DB_PATH", os.path.join(_WORKDIR, "state.sqlite3"))
+os.environ.setdefault("CHECKPOINT_DB_PATH", os.path.join(_WORKDIR, "checkpoints.sqlite3"))
+os.environ.setdefault("TRACE_PATH", os.path.join(_WORKDIR, "traces.jsonl"))
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from benchmark import percentile  # noqa: E402
+from task_store import task_store  # noqa: E402
+
+APPS = ["agentic_ai_assist.py", "research_agent.py"]
+OWNER = "rerun-benchmark"
+
+
+def seed_session(app, path, history):
+    """Give the session `history` chat messages and tasks, or collected facts for the research app."""
+    if not history:
+        return
+    if path == "research_agent.py":
+        app.session_state["collected_facts"] = [
+            {"fact": f"Fact {i}: " + "finding " * 30, "source": f"query {i}"} for i in range(history)
+        ]
+        return
+    app.session_state["chat_history"] = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message {i}. " + "text " * 60}
+        for i in range(history)
+    ]
+    owner = f"{OWNER}-{history}"
+    if task_store.count(owner) < history:
+        with task_store.batch():
+            for i in range(history):
+                task_store.create(owner, {
+                    "id": f"{owner}-{i}", "name": f"Task {i}", "description": "Benchmark task",
+                    "template": "Summarization", "status": "Created", "created_at": datetime.now(),
+                })
+    app.query_params["owner"] = owner
+
+
+def measure_app(path, reruns, clear_resources=False, history=0):
+    """Time one cold run and `reruns` reruns of the app at `path`.
+
+    Returns:
+        Dict with cold run time and p50/p95/mean/max rerun latency in milliseconds
+    """
+    app = AppTest.from_file(path, default_timeout=60)
+    seed_session(app, path, history)
+    started = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - started
+    if app.exception:
+        raise RuntimeError(f"{path} raised: {app.exception[0].message}")
+
+    latencies = []
+    for _ in range(reruns):
+        if clear_resources:
+            st.cache_resource.clear()
+        started = time.perf_counter()
+        app.run()
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "app": path,
+        "reruns": reruns,
+        "clear_resources": clear_resources,
+        "history": history,
+        "cold_ms": cold * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", action="append", choices=APPS, help="App to measure (default: both)")
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--clear-resources", action="store_true", help="Clear st.cache_resource before every rerun")
+    parser.add_argument("--history", default="0", help="Comma-separated session sizes to measure (messages/tasks/facts)")
+    parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    histories = [int(n) for n in args.history.split(",")]
+    results = [
+        measure_app(path, args.reruns, args.clear_resources, history)
+        for path in args.app or APPS
+        for history in histories
+    ]
+
+    print(f"{'app':<22}{'history':>8}{'cold ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+    for r in results:
+        print(f"{r['app']:<22}{r['history']:>8}{r['cold_ms']:>9.0f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['max_ms']:>9.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,29 @@ import os
 import uuid
 import asyncio
 import streamlit as st
-from datetime import datetime
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-from pydantic import BaseModel
+# Reads .env; imported first because the modules below read their settings on import
+from resources import get_router
+import dedup
+import routing
+import structured_output
+import tracing
+from checkpoints import checkpoint_store
+from dedup import DEDUP_THRESHOLD
+from fact_index import FACT_INDEX_DIR, FactIndex
+from llm import CACHE_ENABLED, response_cache
+from model_backend import uses_fake_backend
+from pagination import pager
+from rate_limit import rate_limiter
+from speculation import SPECULATION_ENABLED, speculator
+from state_store import state_store
+from research_pipeline import EXAMPLE_TOPICS, FactCollector, ResearchReport, choose_editor_mode, editor_agent, gather_research, research_topic
+from streaming import StreamTimer
+from trace_panel import render_route_table, render_trace_waterfall
 
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini
-genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Configure Gemini (MODEL_BACKEND=fake swaps in the offline backend); each stage is routed to its own model
+# tier (see routing.py), and the router is built once and shared across reruns
+model = get_router()
 
 # Set up page configuration
 st.set_page_config(
@@ -24,7 +35,7 @@ st.set_page_config(
 )
 
 # Make sure API key is set
-if not os.environ.get("GOOGLE_API_KEY"):
+if not os.environ.get("GOOGLE_API_KEY") and not uses_fake_backend():
     st.error("Please set your GOOGLE_API_KEY environment variable")
     st.stop()
 
@@ -36,79 +47,20 @@ This app demonstrates the power of Google Gemini by creating a multi-agent syste
 that researches news topics and generates comprehensive research reports.
 """)
 
-# Define data models
-class ResearchPlan(BaseModel):
-    topic: str
-    search_queries: list[str]
-    focus_areas: list[str]
-
-class ResearchReport(BaseModel):
-    title: str
-    outline: list[str]
-    report: str
-    sources: list[str]
-    word_count: int
-
-# Custom tool for saving facts found during research
-def save_important_fact(fact: str, source: str = None) -> str:
-    """Save an important fact discovered during research.
-    
-    Args:
-        fact: The important fact to save
-        source: Optional source of the fact
-    
-    Returns:
-        Confirmation message
-    """
-    if "collected_facts" not in st.session_state:
-        st.session_state.collected_facts = []
-    
-    st.session_state.collected_facts.append({
-        "fact": fact,
-        "source": source or "Not specified",
-        "timestamp": datetime.now().strftime("%H:%M:%S")
-    })
-    
-    return f"Fact saved: {fact}"
-
-# Define the agents as functions
-def triage_agent(topic):
-    prompt = f"""You are the coordinator of this research operation. Your job is to:
-    1. Understand the user's research topic: {topic}
-    2. Create a research plan with the following elements:
-       - topic: A clear statement of the research topic
-       - search_queries: A list of 3-5 specific search queries that will help gather information
-       - focus_areas: A list of 3-5 key aspects of the topic to investigate
-    3. Return the plan in JSON format with topic, search_queries, and focus_areas.
-    """
-    response = model.generate_content(prompt)
-    # Parse JSON from response
-    import json
-    try:
-        plan = json.loads(response.text)
-        return ResearchPlan(**plan)
-    except:
-        return ResearchPlan(topic=topic, search_queries=[f"Research {topic}"], focus_areas=[f"General info on {topic}"])
+# Facts listed per page in the Research Process tab
+FACTS_PER_PAGE = 20
 
-def research_agent(query):
-    prompt = f"""You are a research assistant. Given a search term: {query}, produce a concise summary of the results. The summary must be 2-3 paragraphs and less than 300 words. Capture the main points. Write succinctly, no need to have complete sentences or good grammar. This will be consumed by someone synthesizing a report, so its vital you capture the essence and ignore any fluff. Do not include any additional commentary other than the summary itself."""
-    response = model.generate_content(prompt)
-    return response.text
+def render_fact(fact):
+    st.info(f"**Fact**: {fact['fact']}\n\n**Source**: {fact['source']}")
 
-def editor_agent(topic, research_data):
-    prompt = f"""You are a senior researcher tasked with writing a cohesive report for a research query: {topic}. 
-    You will be provided with initial research: {research_data}.
-    You should first come up with an outline for the report that describes the structure and flow of the report. Then, generate the report and return that as your final output.
-    The final output should be in markdown format, and it should be lengthy and detailed. Aim for 5-10 pages of content, at least 1000 words.
-    Return in JSON format with title, outline (list), report, sources (list), word_count.
-    """
-    response = model.generate_content(prompt)
-    import json
-    try:
-        report = json.loads(response.text)
-        return ResearchReport(**report)
-    except:
-        return ResearchReport(title=topic, outline=["Introduction", "Body", "Conclusion"], report=research_data, sources=[], word_count=len(research_data.split()))
+@st.fragment
+def collected_facts_view():
+    """Facts of the last run, paged; turning the page reruns only this view."""
+    facts = st.session_state.collected_facts
+    st.write(f"📚 **Collected Facts** ({len(facts)})")
+    start, end = pager("facts_page", len(facts), FACTS_PER_PAGE)
+    for fact in facts[start:end]:
+        render_fact(fact)
 
 # Create sidebar for input and controls
 with st.sidebar:
@@ -118,42 +70,110 @@ with st.sidebar:
     )
     
     start_button = st.button("Start Research", type="primary", disabled=not user_topic)
+    stream_report = st.toggle("Stream report as it is written", value=True)
+    bypass_cache = st.checkbox("Skip response cache", help="Force fresh model calls instead of reusing cached results")
+    resume_run = st.checkbox("Resume interrupted run", value=True,
+                             help="If a run of this topic was interrupted, reuse the plan and summaries it already completed. "
+                                  "Finished runs, and runs that skip the response cache, always start over")
+    dedup_threshold = st.slider("Duplicate threshold", min_value=0.3, max_value=1.0, value=DEDUP_THRESHOLD, step=0.05,
+                                help="Summaries and facts at least this similar are merged; 1.0 merges only identical text. "
+                                     "Search queries use the stricter QUERY_DEDUP_THRESHOLD")
     
     st.divider()
     st.subheader("Example Topics")
-    example_topics = [
-        "What are the best cruise lines in USA for first-time travelers who have never been on a cruise?",
-        "What are the best affordable espresso machines for someone upgrading from a French press?",
-        "What are the best off-the-beaten-path destinations in India for a first-time solo traveler?"
-    ]
+    example_topics = EXAMPLE_TOPICS
+    # Warm-ups fill the response cache, so they only help while it is enabled
+    warm_examples = st.toggle("Warm example topics", value=SPECULATION_ENABLED and CACHE_ENABLED, disabled=not CACHE_ENABLED,
+                              help="Research the example topics in the background so clicking one answers from the cache")
+    # Warm-ups are shared by every session, so this one only cancels the ones it started
+    if "warmup_keys" not in st.session_state:
+        st.session_state.warmup_keys = []
+    if warm_examples:
+        for topic in example_topics:
+            if speculator.speculate(f"topic:{topic}", research_topic, model, topic, cancellable=True):
+                st.session_state.warmup_keys.append(f"topic:{topic}")
     
     for topic in example_topics:
         if st.button(topic):
             user_topic = topic
             start_button = True
+    
+    cache_stats = response_cache.stats()
+    st.caption(f"Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})")
+    json_stats = structured_output.stats()
+    st.caption(f"JSON output: {json_stats['repaired']} repaired, {json_stats['failure_rate']:.0%} parse failures, {json_stats['retry_rate']:.0%} retries")
+    limiter_stats = rate_limiter.stats()
+    st.caption(f"Rate limiter: {limiter_stats['queue_depth']} queued, {limiter_stats['in_flight']}/{limiter_stats['concurrency_limit']} in flight, {limiter_stats['throttled']} throttled, {limiter_stats['retries']} retries")
+    route_totals = routing.totals()
+    st.caption(f"Model routing: {route_totals['calls']} calls, {route_totals['escalation_rate']:.0%} escalated, {route_totals['slo_attainment']:.0%} within latency SLO")
+    if route_totals["calls"]:
+        with st.expander("Model routes"):
+            render_route_table()
+    dedup_totals = dedup.stats()
+    st.caption(f"Dedup: {dedup_totals['queries_merged']} queries merged, {dedup_totals['texts_collapsed']} summaries collapsed, {dedup_totals['calls_saved']} calls / ~{dedup_totals['prompt_tokens_saved']} prompt tokens saved")
+    spec_stats = speculator.stats()
+    if spec_stats["started"] or warm_examples:
+        st.caption(f"Speculation: {spec_stats['started']} started, {spec_stats['in_flight']} running, {spec_stats['hit_rate']:.0%} hit rate, "
+                   f"{spec_stats['useful_rate']:.0%} used, {spec_stats['wasted']} wasted, {spec_stats['skipped']} skipped (budget/busy)")
+        if spec_stats["in_flight"] and st.session_state.warmup_keys and st.button("Cancel warm-ups"):
+            for key in st.session_state.warmup_keys:
+                speculator.cancel(key)
+            st.session_state.warmup_keys = []
+            st.rerun()
 
 # Main content area with two tabs
 tab1, tab2 = st.tabs(["Research Process", "Report"])
 
 # Initialize session state for storing results
 if "conversation_id" not in st.session_state:
-    st.session_state.conversation_id = str(uuid.uuid4().hex[:16])
-if "collected_facts" not in st.session_state:
-    st.session_state.collected_facts = []
-if "research_done" not in st.session_state:
-    st.session_state.research_done = False
-if "report_result" not in st.session_state:
-    st.session_state.report_result = None
+    # The id lives in the URL so a reload can resume an interrupted run from its checkpoints
+    if "conversation" not in st.query_params:
+        st.query_params["conversation"] = str(uuid.uuid4().hex[:16])
+    st.session_state.conversation_id = st.query_params["conversation"]
+# Facts of the current run, plus an index of the full research text that grows across runs in this conversation
+if "fact_collector" not in st.session_state:
+    if FACT_INDEX_DIR:
+        st.session_state.fact_collector = FactCollector(fact_index=FactIndex.load(os.path.join(FACT_INDEX_DIR, st.session_state.conversation_id)))
+    else:
+        st.session_state.fact_collector = FactCollector()
+# Results are written through to the shared state store under the conversation id, so a reload, a restart
+# or another server process picks them up
+research_scope = f"research:{st.session_state.conversation_id}"
+
+def encode_report(report):
+    return report.model_dump() if isinstance(report, ResearchReport) else report
+
+def decode_report(value):
+    return ResearchReport(**value) if isinstance(value, dict) else value
+
+def save_results():
+    """Write the current facts, report and done flag through to the state store."""
+    state_store.persist(st.session_state, research_scope, "collected_facts")
+    state_store.persist(st.session_state, research_scope, "report_result", encode=encode_report)
+    state_store.persist(st.session_state, research_scope, "research_done")
+
+state_store.hydrate(st.session_state, research_scope, "collected_facts", default=lambda: st.session_state.fact_collector.facts)
+state_store.hydrate(st.session_state, research_scope, "research_done", default=bool)
+state_store.hydrate(st.session_state, research_scope, "report_result", decode=decode_report)
 
 # Main research function
 def run_research(topic):
     # Reset state for new research
-    st.session_state.collected_facts = []
+    st.session_state.fact_collector.reset(dedup_threshold)
+    st.session_state.collected_facts = st.session_state.fact_collector.facts
+    st.session_state.facts_page = 0
     st.session_state.research_done = False
     st.session_state.report_result = None
+    save_results()
     
     with tab1:
         message_container = st.container()
+    
+    # A warm-up still running for this example is joined rather than duplicated; the run below then hits the cache
+    if warm_examples and topic in EXAMPLE_TOPICS and not bypass_cache:
+        with message_container:
+            st.write("♨️ Using the background warm-up for this example topic...")
+        speculator.claim(f"topic:{topic}", keep=True)
         
     # Create error handling container
     error_container = st.empty()
@@ -162,55 +182,97 @@ def run_research(topic):
     with message_container:
         st.write("🔍 **Triage Agent**: Planning research approach...")
     
-    triage_result = triage_agent(topic)
+    facts_container = None
+    more_facts = None
+    shown_facts = 0
     
-    # Check if the result is a ResearchPlan object
-    if hasattr(triage_result, 'topic'):
-        research_plan = triage_result
-        plan_display = {
-            "topic": research_plan.topic,
-            "search_queries": research_plan.search_queries,
-            "focus_areas": research_plan.focus_areas
-        }
-    else:
-        # Fallback
-        research_plan = {
-            "topic": topic,
-            "search_queries": ["Researching " + topic],
-            "focus_areas": ["General information about " + topic]
-        }
-        plan_display = research_plan
+    def on_plan(research_plan):
+        nonlocal facts_container, more_facts
+        with message_container:
+            st.write("📋 **Research Plan**:")
+            st.json(research_plan.model_dump())
+            # research_agent fans out over all queries; facts are shown as each one finishes
+            st.write("📚 **Collected Facts**:")
+            facts_container = st.container()
+            more_facts = st.empty()
     
-    with message_container:
-        st.write("📋 **Research Plan**:")
-        st.json(plan_display)
+    def on_fact(fact):
+        # Only the first page is drawn live; the rest are counted and listed page by page afterwards
+        nonlocal shown_facts
+        if shown_facts < FACTS_PER_PAGE:
+            with facts_container:
+                render_fact(fact)
+            shown_facts += 1
+        else:
+            more_facts.caption(f"… and {len(st.session_state.collected_facts) - shown_facts} more facts")
     
-    # Simulate research by calling research_agent for each query
-    research_summaries = []
-    for query in research_plan.search_queries:
-        summary = research_agent(query)
-        research_summaries.append(summary)
-        # Save some facts
-        save_important_fact(summary[:100], "Gemini Research")
+    # Every completed stage is checkpointed, so a retry only redoes what never finished
+    checkpoint = checkpoint_store.run(st.session_state.conversation_id, topic)
+    if not resume_run:
+        checkpoint.clear()
     
-    # Display facts
-    with message_container:
-        st.write("📚 **Collected Facts**:")
-        for fact in st.session_state.collected_facts:
-            st.info(f"**Fact**: {fact['fact']}\n\n**Source**: {fact['source']}")
+    research_plan, research_summaries, run_stats = gather_research(
+        model, topic, st.session_state.fact_collector, dedup_threshold, bypass_cache, on_plan=on_plan, on_fact=on_fact,
+        checkpoint=checkpoint,
+    )
+    if FACT_INDEX_DIR:
+        st.session_state.fact_collector.fact_index.save(os.path.join(FACT_INDEX_DIR, st.session_state.conversation_id))
+    st.session_state.run_stats = run_stats
+    state_store.persist(st.session_state, research_scope, "collected_facts")
+    if run_stats["queries_merged"] or run_stats["summaries_collapsed"]:
+        with message_container:
+            st.caption(f"Dedup: merged {run_stats['queries_merged']} duplicate queries and {run_stats['summaries_collapsed']} duplicate summaries, "
+                       f"saving {run_stats['calls_saved']} calls and ~{run_stats['prompt_tokens_saved']} prompt tokens")
+    if run_stats["plan_resumed"] or run_stats["queries_resumed"]:
+        with message_container:
+            st.caption(f"Resumed from checkpoint: {'plan and ' if run_stats['plan_resumed'] else ''}{run_stats['queries_resumed']} of {run_stats['queries']} query summaries")
+    if run_stats["queries_failed"]:
+        with message_container:
+            st.warning(f"{run_stats['queries_failed']} research queries failed; start the run again to retry only those")
+    if not research_summaries:
+        # A report written from no research would be made up; the plan is checkpointed for the retry
+        with message_container:
+            st.error("Every research query failed, so no report was written. Start the run again to retry.")
+        save_results()
+        return
     
     # Editor Agent phase
+    research_data = "\n".join(research_summaries)
+    editor_mode = choose_editor_mode(research_data, research_summaries)
     with message_container:
-        st.write("📝 **Editor Agent**: Creating comprehensive research report...")
+        if editor_mode == "map_reduce":
+            st.write("📝 **Editor Agent**: Writing report sections in parallel...")
+        else:
+            st.write("📝 **Editor Agent**: Creating comprehensive research report...")
     
+    timer = StreamTimer()
     try:
-        research_data = "\n".join(research_summaries)
-        report_result = editor_agent(topic, research_data)
+        if stream_report:
+            with message_container:
+                live_report = st.empty()
+            report_result = editor_agent(model, topic, research_data, on_report=live_report.markdown, timer=timer, bypass_cache=bypass_cache,
+                                         summaries=research_summaries, focus_areas=research_plan.focus_areas, mode=editor_mode,
+                                         fact_index=st.session_state.fact_collector.fact_index)
+            live_report.empty()
+        else:
+            report_result = editor_agent(model, topic, research_data, timer=timer, bypass_cache=bypass_cache,
+                                         summaries=research_summaries, focus_areas=research_plan.focus_areas, mode=editor_mode,
+                                         fact_index=st.session_state.fact_collector.fact_index)
+        
+        # Marks the run finished so starting it again does a fresh run; a run with failed queries
+        # stays resumable and starting it again retries only those
+        if not run_stats["queries_failed"]:
+            checkpoint.put("report", report_result.model_dump())
         
         st.session_state.report_result = report_result
+        st.session_state.editor_timing = timer.as_dict()
         
         with message_container:
             st.write("✅ **Research Complete! Report Generated.**")
+            if timer.ttft is not None:
+                st.caption(f"Editor: first token after {timer.ttft:.1f}s, complete after {timer.total:.1f}s")
+            else:
+                st.caption(f"Editor: complete after {timer.total:.1f}s")
             
             # Preview a snippet of the report
             if hasattr(report_result, 'report'):
@@ -227,17 +289,31 @@ def run_research(topic):
         st.session_state.report_result = f"# Research on {topic}\n\n{research_data}"
     
     st.session_state.research_done = True
+    save_results()
 
 # Run the research when the button is clicked
 if start_button:
     with st.spinner(f"Researching: {user_topic}"):
         try:
-            run_research(user_topic)
+            # All agent calls of this run nest under one span in the conversation's trace
+            with tracing.span("run_research", trace_id=st.session_state.conversation_id, topic=user_topic):
+                run_research(user_topic)
         except Exception as e:
             st.error(f"An error occurred during research: {str(e)}")
             # Set a basic report result so the user gets something
             st.session_state.report_result = f"# Research on {user_topic}\n\nUnfortunately, an error occurred during the research process. Please try again later or with a different topic.\n\nError details: {str(e)}"
             st.session_state.research_done = True
+            save_results()
+
+# Facts of the last run, one page at a time (the run that just finished already showed them live)
+with tab1:
+    if st.session_state.collected_facts and not start_button:
+        collected_facts_view()
+
+# Debug panel: waterfall of the last research run
+with tab1:
+    with st.expander("🔎 Debug: trace of the last run"):
+        render_trace_waterfall(st.session_state.conversation_id)
 
 # Display results in the Report tab
 with tab2:
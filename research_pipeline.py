@@ -0,0 +1,505 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from datetime import datetime
+
+from pydantic import BaseModel
+
+import structured_output
+from dedup import DEDUP_THRESHOLD, QUERY_DEDUP_THRESHOLD, NearDuplicateIndex, dedupe_queries, dedupe_texts
+from fact_index import FactIndex, split_facts
+from llm import generate_stream, generate_text, invalidate
+from rate_limit import estimate_tokens
+from streaming import partial_json_string
+from structured_output import generate_structured, json_config, parse_structured
+
+# Research fan-out settings
+RESEARCH_MAX_CONCURRENCY = int(os.environ.get("RESEARCH_MAX_CONCURRENCY", "5"))
+RESEARCH_QUERY_TIMEOUT = float(os.environ.get("RESEARCH_QUERY_TIMEOUT", "60"))
+
+# Editor settings: "auto" switches to map-reduce once the research exceeds the token budget
+EDITOR_MODE = os.environ.get("EDITOR_MODE", "auto")
+EDITOR_TOKEN_BUDGET = int(os.environ.get("EDITOR_TOKEN_BUDGET", "4000"))
+EDITOR_SECTION_TOP_K = int(os.environ.get("EDITOR_SECTION_TOP_K", "5"))
+# Facts at or below this cosine similarity to a section are not relevant to it
+EDITOR_SECTION_MIN_SCORE = float(os.environ.get("EDITOR_SECTION_MIN_SCORE", "0.05"))
+
+# Topics offered as one-click examples in the research app
+EXAMPLE_TOPICS = [
+    "What are the best cruise lines in USA for first-time travelers who have never been on a cruise?",
+    "What are the best affordable espresso machines for someone upgrading from a French press?",
+    "What are the best off-the-beaten-path destinations in India for a first-time solo traveler?"
+]
+
+class ResearchCancelled(Exception):
+    """Raised between stages when a run's cancel_event is set."""
+
+class ResearchFailed(Exception):
+    """Raised when no research query produced a summary, so there is nothing to write a report from."""
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise ResearchCancelled()
+
+# Define data models
+class ResearchPlan(BaseModel):
+    topic: str
+    search_queries: list[str]
+    focus_areas: list[str]
+
+class ResearchReport(BaseModel):
+    title: str
+    outline: list[str]
+    report: str
+    sources: list[str]
+    word_count: int
+
+class ReportOutline(BaseModel):
+    title: str
+    sections: list[str]
+
+class ReportFrame(BaseModel):
+    title: str
+    introduction: str
+    conclusion: str
+    sources: list[str]
+
+# Define the agents as functions
+def triage_agent(model, topic, bypass_cache=False):
+    prompt = f"""You are the coordinator of this research operation. Your job is to:
+    1. Understand the user's research topic: {topic}
+    2. Create a research plan with the following elements:
+       - topic: A clear statement of the research topic
+       - search_queries: A list of 3-5 specific search queries that will help gather information
+       - focus_areas: A list of 3-5 key aspects of the topic to investigate
+    3. Return the plan in JSON format with topic, search_queries, and focus_areas.
+    """
+    plan = generate_structured(model, prompt, ResearchPlan, bypass_cache=bypass_cache, stage="triage")
+    if plan is None:
+        return ResearchPlan(topic=topic, search_queries=[f"Research {topic}"], focus_areas=[f"General info on {topic}"])
+    return plan
+
+def research_prompt(query):
+    return f"""You are a research assistant. Given a search term: {query}, produce a concise summary of the results. The summary must be 2-3 paragraphs and less than 300 words. Capture the main points. Write succinctly, no need to have complete sentences or good grammar. This will be consumed by someone synthesizing a report, so its vital you capture the essence and ignore any fluff. Do not include any additional commentary other than the summary itself."""
+
+def research_agent(model, query, timeout=None, bypass_cache=False, index=None, cancel_event=None):
+    # Queries still queued when the run is cancelled never call the model
+    check_cancelled(cancel_event)
+    prompt = research_prompt(query)
+    # The timeout covers the whole query: every tier of the research cascade and every rate-limit retry
+    deadline = time.monotonic() + timeout if timeout else None
+    stage = f"research[{index}]" if index is not None else "research"
+    return generate_text(model, prompt, bypass_cache=bypass_cache, stage=stage, deadline=deadline)
+
+def run_research_queries(model, queries, on_result=None, max_concurrency=RESEARCH_MAX_CONCURRENCY, timeout=RESEARCH_QUERY_TIMEOUT, bypass_cache=False, on_error=None,
+                         cancel_event=None):
+    """Run research_agent for every query concurrently on a bounded thread pool.
+    
+    Args:
+        model: Model used for the research calls
+        queries: Search queries from the research plan
+        on_result: Optional callback(index, query, summary) called on the calling
+            thread as each query finishes, in completion order
+        max_concurrency: Maximum number of research calls in flight at once
+        timeout: Per-query timeout in seconds, covering every cascade tier and
+            rate-limit retry of the query
+        bypass_cache: Skip the response cache for these calls
+        on_error: Optional callback(index, query, message) for failed or timed
+            out queries
+        cancel_event: Optional threading.Event; once set, queries that have not
+            started yet fail without a model call
+    
+    Returns:
+        List of summaries in the same order as queries, with None for each
+        query that failed or timed out
+    """
+    summaries = [None] * len(queries)
+    if not queries:
+        return summaries
+    
+    workers = max(1, min(max_concurrency, len(queries)))
+    # Every query gets its own timeout, so the batch as a whole is bounded by
+    # the number of "waves" the pool needs to get through the plan
+    waves = -(-len(queries) // workers)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="research")
+    # Each call runs in a copy of the caller's context so its trace span nests under the current one
+    futures = {
+        executor.submit(contextvars.copy_context().run, research_agent, model, query, timeout, bypass_cache, i, cancel_event): i
+        for i, query in enumerate(queries)
+    }
+    
+    finished = set()
+    
+    def finish(index, summary=None, error=None):
+        finished.add(index)
+        summaries[index] = summary
+        if error is not None:
+            if on_error:
+                on_error(index, queries[index], error)
+        elif on_result:
+            on_result(index, queries[index], summary)
+    
+    try:
+        for future in as_completed(futures, timeout=timeout * waves + 5 if timeout else None):
+            index = futures[future]
+            try:
+                finish(index, future.result())
+            except Exception as e:
+                finish(index, error=f"Research failed for '{queries[index]}': {e}")
+    except FuturesTimeoutError:
+        for future, index in futures.items():
+            if index not in finished:
+                finish(index, error=f"Research timed out for '{queries[index]}'")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    return summaries
+
+def choose_editor_mode(research_data, summaries=None, mode=EDITOR_MODE, token_budget=EDITOR_TOKEN_BUDGET):
+    """Pick "single" or "map_reduce" for the editor stage.
+
+    In "auto" mode the report is written in one call while the research fits in
+    `token_budget` prompt tokens, and section by section once it does not.
+    """
+    if mode != "auto":
+        return mode
+    if summaries is not None and len(summaries) < 2:
+        return "single"
+    return "map_reduce" if estimate_tokens(research_data) > token_budget else "single"
+
+def editor_agent(model, topic, research_data, on_report=None, timer=None, bypass_cache=False, summaries=None, focus_areas=None, mode=EDITOR_MODE, fact_index=None):
+    """Write the final report, in one call or map-reduce depending on `mode`.
+    
+    Args:
+        model: Model used for the editor calls
+        topic: Research topic
+        research_data: All research summaries joined into one string
+        on_report: Optional callback(partial_report_markdown) for incremental rendering
+        timer: Optional StreamTimer recording first output and total latency
+        bypass_cache: Skip the response cache for these calls
+        summaries: Individual research summaries (used by map-reduce)
+        focus_areas: Outline sections from the research plan (used by map-reduce)
+        mode: "auto", "single" or "map_reduce"
+        fact_index: Optional FactIndex that map-reduce sections retrieve from
+    
+    Returns:
+        ResearchReport
+    """
+    if choose_editor_mode(research_data, summaries, mode) == "map_reduce":
+        if summaries is None:
+            summaries = [part for part in research_data.split("\n\n") if part.strip()]
+        return map_reduce_editor(model, topic, summaries, focus_areas=focus_areas, on_report=on_report, timer=timer, bypass_cache=bypass_cache, fact_index=fact_index)
+    return single_shot_editor(model, topic, research_data, on_report=on_report, timer=timer, bypass_cache=bypass_cache)
+
+def single_shot_editor(model, topic, research_data, on_report=None, timer=None, bypass_cache=False):
+    prompt = f"""You are a senior researcher tasked with writing a cohesive report for a research query: {topic}. 
+    You will be provided with initial research: {research_data}.
+    You should first come up with an outline for the report that describes the structure and flow of the report. Then, generate the report and return that as your final output.
+    The final output should be in markdown format, and it should be lengthy and detailed. Aim for 5-10 pages of content, at least 1000 words.
+    Return in JSON format with title, outline (list), report, sources (list), word_count.
+    """
+    if on_report:
+        # Stream the completion and surface the `report` field as it grows
+        config = json_config(ResearchReport)
+        chunks = []
+        for chunk in generate_stream(model, prompt, generation_config=config, timer=timer, bypass_cache=bypass_cache, stage="editor"):
+            chunks.append(chunk)
+            partial_report = partial_json_string("".join(chunks), "report")
+            if partial_report:
+                on_report(partial_report)
+        report = parse_structured("".join(chunks), ResearchReport)
+        if report is None:
+            # The streamed output was unusable; retry once without streaming
+            invalidate(model, prompt, config, stage="editor")
+            structured_output.record_retry()
+            report = generate_structured(model, prompt, ResearchReport, retries=0, bypass_cache=bypass_cache, stage="editor")
+    else:
+        report = generate_structured(model, prompt, ResearchReport, bypass_cache=bypass_cache, stage="editor")
+    if timer:
+        timer.stop()
+    if report is None:
+        return ResearchReport(title=topic, outline=["Introduction", "Body", "Conclusion"], report=research_data, sources=[], word_count=len(research_data.split()))
+    return report
+
+def relevant_facts(topic, sections, summaries, k=EDITOR_SECTION_TOP_K, fact_index=None, min_score=EDITOR_SECTION_MIN_SCORE):
+    """Pick the `k` facts most relevant to each section with one batched search.
+    
+    Args:
+        topic: Research topic, added to each section heading for retrieval
+        sections: Section headings
+        summaries: Research summaries, indexed paragraph by paragraph when no
+            fact_index is given
+        k: Facts per section
+        fact_index: Optional FactIndex holding this run's facts; only facts
+            indexed for `topic` are used, so earlier topics in the same
+            conversation do not leak into the report
+        min_score: Facts scoring this or lower are skipped; a section that no
+            fact clears gets the topic's closest facts instead
+    
+    Returns:
+        One string of joined facts per section
+    """
+    where = {"topic": topic}
+    if fact_index is None or not any(m.get("topic") == topic for m in fact_index.metadata):
+        fact_index, where = FactIndex(), None
+        fact_index.add(split_facts(summaries))
+    queries = [f"{topic} {section}" for section in sections]
+    hits = fact_index.top_texts(queries, k, min_score, where)
+    missing = [i for i, texts in enumerate(hits) if not texts]
+    if missing:
+        for i, texts in zip(missing, fact_index.top_texts([queries[i] for i in missing], k, float("-inf"), where)):
+            hits[i] = texts
+    # The same paragraph is indexed again when a topic is researched twice
+    return ["\n\n".join(dict.fromkeys(texts)) for texts in hits]
+
+def outline_agent(model, topic, summaries, bypass_cache=False):
+    """Cheap outline call used when the research plan has no focus areas."""
+    digest = "\n".join(f"- {summary[:200]}" for summary in summaries)
+    prompt = f"""You are planning a research report on: {topic}.
+    The research covers:
+    {digest}
+    Return JSON with a title and 4-6 section headings (sections) that give the report a logical structure.
+    """
+    outline = generate_structured(model, prompt, ReportOutline, bypass_cache=bypass_cache, stage="editor.outline")
+    if outline is None or not outline.sections:
+        return ReportOutline(title=topic, sections=["Overview", "Key Findings", "Recommendations"])
+    return outline
+
+def section_agent(model, topic, section, research, bypass_cache=False, index=None):
+    prompt = f"""You are a senior researcher writing one section of a report on: {topic}.
+    Section: {section}
+    Relevant research:
+    {research}
+    Write only this section in markdown, starting with the heading "## {section}". Be detailed and specific, 250-400 words. Do not write an introduction or conclusion for the whole report.
+    """
+    stage = f"editor.section[{index}]" if index is not None else "editor.section"
+    return generate_text(model, prompt, bypass_cache=bypass_cache, stage=stage)
+
+def stitch_agent(model, topic, sections, section_texts, bypass_cache=False):
+    """Final pass: title, introduction, conclusion and sources around the finished sections."""
+    digest = "\n".join(f"- {section}: {text.strip()[:300]}" for section, text in zip(sections, section_texts))
+    prompt = f"""You are the editor assembling a research report on: {topic}.
+    The report body is already written. Its sections and their opening lines are:
+    {digest}
+    Write a title, a short introduction previewing the sections, a short conclusion, and the sources mentioned.
+    Return JSON with title, introduction, conclusion, sources (list).
+    """
+    return generate_structured(model, prompt, ReportFrame, bypass_cache=bypass_cache, stage="editor.stitch")
+
+def map_reduce_editor(model, topic, summaries, focus_areas=None, on_report=None, timer=None, bypass_cache=False, max_concurrency=RESEARCH_MAX_CONCURRENCY, fact_index=None):
+    """Write the report section by section in parallel, then stitch it together.
+    
+    Each section only sees the top-k facts relevant to it, so prompt size stays
+    flat as the plan gets wider, and wall-clock time is close to the slowest
+    section plus one short stitching call.
+    """
+    if focus_areas:
+        title, sections = topic, list(focus_areas)
+    else:
+        outline = outline_agent(model, topic, summaries, bypass_cache=bypass_cache)
+        title, sections = outline.title, outline.sections
+    
+    section_research = relevant_facts(topic, sections, summaries, fact_index=fact_index)
+    section_texts = [None] * len(sections)
+    workers = max(1, min(max_concurrency, len(sections)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="editor") as executor:
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run, section_agent, model, topic, section,
+                section_research[i], bypass_cache, i,
+            ): i
+            for i, section in enumerate(sections)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                section_texts[index] = future.result()
+            except Exception as e:
+                section_texts[index] = f"## {sections[index]}\n\n_Section could not be generated: {e}_"
+            if timer:
+                timer.mark_token()
+            if on_report:
+                # Show the finished prefix of the report in order
+                ready = []
+                for text in section_texts:
+                    if text is None:
+                        break
+                    ready.append(text)
+                if ready:
+                    on_report("\n\n".join(ready))
+    
+    frame = stitch_agent(model, topic, sections, section_texts, bypass_cache=bypass_cache)
+    if frame is None:
+        frame = ReportFrame(title=title, introduction="", conclusion="", sources=[])
+    parts = [f"# {frame.title}"]
+    if frame.introduction:
+        parts.append(frame.introduction)
+    parts.extend(text.strip() for text in section_texts)
+    if frame.conclusion:
+        parts.append(f"## Conclusion\n\n{frame.conclusion}")
+    report = "\n\n".join(parts)
+    if timer:
+        timer.stop()
+    return ResearchReport(
+        title=frame.title,
+        outline=sections,
+        report=report,
+        sources=frame.sources,
+        word_count=len(report.split()),
+    )
+
+class FactCollector:
+    """Facts saved during research runs, with near-duplicates collapsed.
+    
+    Holds the short fact list shown to the user and a FactIndex with the full
+    research text for per-section retrieval. The index keeps growing across
+    runs; `reset` only clears the per-run fact list.
+    """
+    
+    def __init__(self, threshold=DEDUP_THRESHOLD, fact_index=None):
+        self.fact_index = fact_index if fact_index is not None else FactIndex()
+        self.reset(threshold)
+    
+    def reset(self, threshold=DEDUP_THRESHOLD):
+        self.facts = []
+        self._dedup = NearDuplicateIndex(threshold)
+    
+    def save(self, fact, source=None, full_text=None, metadata=None):
+        """Save a fact unless it repeats one already saved in this run, and index `full_text`.
+        
+        Args:
+            fact: Short fact shown to the user
+            source: Optional source of the fact
+            full_text: Optional full research text to index for retrieval
+            metadata: Optional dict stored with each indexed paragraph
+        
+        Returns:
+            The saved fact dict, or None if it was a duplicate
+        """
+        # Only the short fact is deduplicated; the full text may differ after
+        # a similar opening and is indexed either way
+        if full_text:
+            paragraphs = split_facts([full_text])
+            self.fact_index.add(paragraphs, [dict(metadata or {}) for _ in paragraphs])
+        if self._dedup.add(fact) is not None:
+            return None
+        entry = {
+            "fact": fact,
+            "source": source or "Not specified",
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+        }
+        self.facts.append(entry)
+        return entry
+
+def gather_research(model, topic, facts=None, dedup_threshold=DEDUP_THRESHOLD, bypass_cache=False, on_plan=None, on_fact=None, checkpoint=None,
+                    query_threshold=QUERY_DEDUP_THRESHOLD, cancel_event=None):
+    """Triage a topic and research its queries; shared by the app and the batch CLI.
+    
+    Near-identical queries are merged before fan-out and repeated summaries are
+    dropped before they reach the editor. With a checkpoint, the plan and each
+    successful summary are recorded as they finish and reused on a retry, so
+    only the stages that never completed (e.g. a single failed query) run again.
+    A checkpoint that already holds a report, or any checkpoint when
+    `bypass_cache` is set, is cleared first and the run starts from scratch.
+    
+    Args:
+        model: Model used for the calls
+        topic: Research topic
+        facts: FactCollector that receives a fact per finished query
+        dedup_threshold: Similarity at which summaries and facts are merged
+        bypass_cache: Skip the response cache for these calls
+        on_plan: Optional callback(ResearchPlan) once triage is done
+        on_fact: Optional callback(fact dict) for each newly saved fact
+        checkpoint: Optional checkpoints.RunCheckpoint for this run
+        query_threshold: Similarity at which search queries are merged (compared word by word)
+        cancel_event: Optional threading.Event checked between stages; once it
+            is set the run raises ResearchCancelled instead of making more calls
+    
+    Returns:
+        Tuple of (ResearchPlan, summaries, run stats dict with dedup savings and
+        resumed/failed counts)
+    """
+    if facts is None:
+        facts = FactCollector(dedup_threshold)
+    # Only an interrupted run resumes; a finished one, or one that must skip the cache, starts over
+    if checkpoint and (bypass_cache or checkpoint.get("report") is not None):
+        checkpoint.clear()
+    stored_plan = checkpoint.get("plan") if checkpoint else None
+    if stored_plan is not None:
+        plan = ResearchPlan(**stored_plan)
+    else:
+        plan = triage_agent(model, topic, bypass_cache=bypass_cache)
+        if checkpoint:
+            checkpoint.put("plan", plan.model_dump())
+    if on_plan:
+        on_plan(plan)
+    check_cancelled(cancel_event)
+    
+    failed = []
+    
+    def collect(query, summary):
+        fact = facts.save(summary[:100], "Gemini Research", full_text=summary, metadata={"topic": topic, "query": query})
+        if fact is not None and on_fact:
+            on_fact(fact)
+    
+    def on_result(index, query, summary):
+        if checkpoint:
+            checkpoint.put("summary", summary, key=query)
+        collect(query, summary)
+    
+    def on_error(index, query, message):
+        failed.append(query)
+    
+    queries, query_dedup = dedupe_queries(plan.search_queries, query_threshold, prompt_for=research_prompt)
+    done = {}
+    if checkpoint:
+        for query in queries:
+            summary = checkpoint.get("summary", key=query)
+            if summary is not None:
+                done[query] = summary
+                collect(query, summary)
+    pending = [query for query in queries if query not in done]
+    done.update(zip(pending, run_research_queries(model, pending, on_result=on_result, bypass_cache=bypass_cache, on_error=on_error,
+                                                      cancel_event=cancel_event)))
+    check_cancelled(cancel_event)
+    # Failed queries have no summary; they are counted in run_stats and never reach the editor
+    summaries, summary_dedup = dedupe_texts([done[query] for query in queries if done[query] is not None], dedup_threshold)
+    run_stats = {
+        "plan_resumed": stored_plan is not None,
+        "queries": len(queries),
+        "queries_resumed": len(queries) - len(pending),
+        "queries_failed": len(failed),
+        "queries_merged": len(query_dedup["merged"]),
+        "summaries_collapsed": summary_dedup["collapsed"],
+        "calls_saved": query_dedup["calls_saved"],
+        "prompt_tokens_saved": query_dedup["prompt_tokens_saved"] + summary_dedup["prompt_tokens_saved"],
+    }
+    return plan, summaries, run_stats
+
+def research_topic(model, topic, facts=None, dedup_threshold=DEDUP_THRESHOLD, bypass_cache=False, editor_mode=EDITOR_MODE, checkpoint=None,
+                   query_threshold=QUERY_DEDUP_THRESHOLD, cancel_event=None):
+    """Run the whole pipeline for one topic without any UI.
+    
+    With a checkpoint, an interrupted run resumes where it stopped. Setting
+    `cancel_event` stops the run at the next stage boundary (ResearchCancelled).
+    
+    Returns:
+        Tuple of (ResearchPlan, ResearchReport, run stats dict)
+    
+    Raises:
+        ResearchFailed: If every research query failed; the editor is not called
+    """
+    if facts is None:
+        facts = FactCollector(dedup_threshold)
+    plan, summaries, run_stats = gather_research(model, topic, facts, dedup_threshold, bypass_cache, checkpoint=checkpoint,
+                                                query_threshold=query_threshold, cancel_event=cancel_event)
+    if not summaries:
+        raise ResearchFailed(f"All {run_stats['queries']} research queries failed for '{topic}'")
+    report = editor_agent(model, topic, "\n".join(summaries), bypass_cache=bypass_cache, summaries=summaries,
+                          focus_areas=plan.focus_areas, mode=editor_mode, fact_index=facts.fact_index)
+    # Marks the run finished so the next start does not resume it; a run with failed
+    # queries stays resumable, and a retry re-runs only those queries
+    if checkpoint and not run_stats["queries_failed"]:
+        checkpoint.put("report", report.model_dump())
+    return plan, report, run_stats
@@ -0,0 +1,30 @@
+"""Process-wide resources shared by every Streamlit session and rerun.
+
+Streamlit re-executes the app script on each interaction, so anything built at
+its top level is rebuilt every time. Resources here are created once per
+process through st.cache_resource and handed back on later reruns.
+
+Importing this module also reads .env into the environment. Most modules read
+their settings when they are imported, so the apps import it before anything
+else.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import streamlit as st  # noqa: E402
+
+from model_backend import create_backend  # noqa: E402
+from routing import ModelRouter  # noqa: E402
+
+
+@st.cache_resource
+def get_router():
+    """ModelRouter shared by all sessions; it builds one backend per model it routes to.
+
+    Backends are built by the router itself rather than through st.cache_resource
+    because the first call for a model may come from a worker thread, where
+    Streamlit's caches are unavailable. google.generativeai is only imported
+    when the first call is made.
+    """
+    return ModelRouter(factory=create_backend)
@@ -0,0 +1,228 @@
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import tracing
+from model_backend import ModelBackend, create_backend
+
+# Stage -> (models cheapest first, joined by ">"; latency SLO in ms; shortest acceptable text answer)
+# A route with several models is a cascade: the first model is tried and the
+# call escalates to the next one if the output fails schema validation or is
+# too short to be useful.
+DEFAULT_ROUTES = {
+    "ping": ("gemini-2.5-flash-lite", 3000, 1),
+    "triage": ("gemini-2.5-flash-lite>gemini-2.5-flash", 10000, 1),
+    "research": ("gemini-2.5-flash-lite>gemini-2.5-flash", 15000, 200),
+    "editor": ("gemini-2.5-flash", 90000, 1),
+    # Map-reduce editor: the outline and the intro/conclusion are short structured
+    # calls, each section is a fraction of a full report
+    "editor.outline": ("gemini-2.5-flash-lite>gemini-2.5-flash", 15000, 1),
+    "editor.section": ("gemini-2.5-flash", 30000, 1),
+    "editor.stitch": ("gemini-2.5-flash-lite>gemini-2.5-flash", 15000, 1),
+    "plan": ("gemini-2.5-flash-lite>gemini-2.5-flash", 15000, 1),
+    "execute": ("gemini-2.5-flash", 90000, 1),
+    "chat": ("gemini-2.5-flash", 15000, 1),
+    "chat.summary": ("gemini-2.5-flash-lite", 15000, 1),
+}
+# Used for stages without a route of their own
+DEFAULT_MODEL = os.environ.get("MODEL_DEFAULT", "gemini-2.5-flash")
+DEFAULT_SLO_MS = 30000
+# With cascading off every route goes straight to its last (strongest) model
+CASCADE_ENABLED = os.environ.get("MODEL_CASCADE", "1").lower() not in ("0", "false", "no")
+
+_INDEX_PATTERN = re.compile(r"\[\d+\]$")
+
+_stats_lock = threading.Lock()
+route_stats = {}
+_latencies = defaultdict(lambda: deque(maxlen=500))
+
+
+class Route:
+    """Models and latency target for one stage.
+
+    Args:
+        name: Route name, e.g. "triage" or "chat.summary"
+        models: Model names, cheapest first
+        slo_ms: Latency objective for a whole call, escalations included
+        min_chars: Text answers shorter than this are escalated as low quality
+    """
+
+    def __init__(self, name, models, slo_ms=DEFAULT_SLO_MS, min_chars=1):
+        self.name = name
+        self.models = list(models)
+        self.slo_ms = slo_ms
+        self.min_chars = min_chars
+
+    def acceptable(self, text):
+        return len(text.strip()) >= self.min_chars
+
+
+def load_routes():
+    """Default routes with MODEL_ROUTE_<STAGE> and MODEL_SLO_<STAGE>_MS overrides.
+
+    e.g. MODEL_ROUTE_RESEARCH="gemini-2.5-flash" turns the research cascade off
+    and MODEL_SLO_CHAT_SUMMARY_MS=5000 tightens the chat summary SLO.
+    """
+    routes = {}
+    for name, (models, slo_ms, min_chars) in DEFAULT_ROUTES.items():
+        env_name = name.upper().replace(".", "_")
+        models = os.environ.get(f"MODEL_ROUTE_{env_name}", models)
+        slo_ms = float(os.environ.get(f"MODEL_SLO_{env_name}_MS", slo_ms))
+        routes[name] = Route(name, [m.strip() for m in models.split(">") if m.strip()], slo_ms, min_chars)
+    return routes
+
+
+class ModelRouter(ModelBackend):
+    """Picks the model(s) for each call from the call's stage.
+
+    Passed around in place of a single model; llm.py and structured_output.py
+    resolve it per call. "research[3]" uses the "research" route, and a dotted
+    stage without a route of its own, e.g. "chat.summary.retry", uses its
+    parent's.
+
+    Args:
+        routes: Route name -> Route (defaults to load_routes())
+        factory: Builds the backend for a model name; each is built once
+        cascade: Try cheaper models first; if False only the last model of a route is used
+    """
+
+    def __init__(self, routes=None, factory=create_backend, cascade=CASCADE_ENABLED):
+        self.routes = routes if routes is not None else load_routes()
+        self.factory = factory
+        self.cascade = cascade
+        self.model_name = f"router:{DEFAULT_MODEL}"
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    def route(self, stage):
+        name = _INDEX_PATTERN.sub("", stage)
+        while name:
+            if name in self.routes:
+                return self.routes[name]
+            name = name.rpartition(".")[0]
+        return Route(_INDEX_PATTERN.sub("", stage), [DEFAULT_MODEL])
+
+    def backend(self, model_name):
+        with self._lock:
+            if model_name not in self._backends:
+                self._backends[model_name] = self.factory(model_name)
+            return self._backends[model_name]
+
+    def tiers(self, stage):
+        """The route for `stage` and the backends to try, in order."""
+        route = self.route(stage)
+        models = route.models if self.cascade else route.models[-1:]
+        return route, [self.backend(name) for name in models]
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        # Direct calls have no stage; they go to the default model
+        return self.backend(DEFAULT_MODEL).generate_content(
+            prompt, generation_config=generation_config, stream=stream, request_options=request_options
+        )
+
+
+def resolve(model, stage):
+    """Return (route, backends) for a call; a plain backend is used as-is with no route."""
+    if isinstance(model, ModelRouter):
+        return model.tiers(stage)
+    return None, [model]
+
+
+class Decision:
+    """What a routed call did: the model that answered and why earlier ones were skipped."""
+
+    def __init__(self, route, stage):
+        self.route = route
+        self.stage = stage
+        self.model = None
+        self.escalations = []
+        self.failed = False
+        self._started = time.perf_counter()
+
+    def use(self, backend):
+        self.model = getattr(backend, "model_name", None) or type(backend).__name__
+
+    def escalate(self, reason):
+        self.escalations.append(f"{self.model}: {reason}")
+
+    def attrs(self):
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        return {
+            "model": self.model,
+            "escalations": len(self.escalations),
+            "escalation_reasons": self.escalations or None,
+            "slo_ms": self.route.slo_ms,
+            "slo_met": elapsed_ms <= self.route.slo_ms,
+            "elapsed_ms": round(elapsed_ms, 1),
+            "accepted": not self.failed,
+        }
+
+
+@contextmanager
+def decision(route, stage):
+    """Record one routed call as a "route" span and in the route counters.
+
+    The model calls made inside are children of the span, so the trace shows
+    each tier that was tried.
+    """
+    current = Decision(route, stage)
+    with tracing.span(f"route:{stage}", kind="route", route=route.name) as span:
+        try:
+            yield current
+        except BaseException:
+            current.failed = True
+            raise
+        finally:
+            attrs = current.attrs()
+            span.set(**attrs)
+            record(route, attrs)
+
+
+def record(route, attrs):
+    with _stats_lock:
+        counters = route_stats.setdefault(route.name, {
+            "calls": 0, "escalated": 0, "failed": 0, "slo_breaches": 0, "slo_ms": route.slo_ms, "models": {},
+        })
+        counters["calls"] += 1
+        counters["escalated"] += 1 if attrs["escalations"] else 0
+        counters["failed"] += 0 if attrs["accepted"] else 1
+        counters["slo_breaches"] += 0 if attrs["slo_met"] else 1
+        counters["models"][attrs["model"]] = counters["models"].get(attrs["model"], 0) + 1
+        _latencies[route.name].append(attrs["elapsed_ms"])
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def stats():
+    """Per-route counters with escalation rate, SLO attainment and p50/p95 latency (ms)."""
+    with _stats_lock:
+        snapshot = {name: {**counters, "models": dict(counters["models"])} for name, counters in route_stats.items()}
+        latencies = {name: list(values) for name, values in _latencies.items()}
+    for name, counters in snapshot.items():
+        calls = counters["calls"]
+        counters["escalation_rate"] = counters["escalated"] / calls if calls else 0.0
+        counters["slo_attainment"] = 1 - counters["slo_breaches"] / calls if calls else 1.0
+        counters["p50_ms"] = _percentile(latencies[name], 0.50)
+        counters["p95_ms"] = _percentile(latencies[name], 0.95)
+    return snapshot
+
+
+def totals():
+    """All routes summed: calls, escalated, slo_breaches plus the two rates."""
+    routes = stats()
+    calls = sum(r["calls"] for r in routes.values())
+    escalated = sum(r["escalated"] for r in routes.values())
+    breaches = sum(r["slo_breaches"] for r in routes.values())
+    return {
+        "calls": calls,
+        "escalated": escalated,
+        "slo_breaches": breaches,
+        "escalation_rate": escalated / calls if calls else 0.0,
+        "slo_attainment": 1 - breaches / calls if calls else 1.0,
+    }
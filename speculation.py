@@ -0,0 +1,173 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import tracing
+from rate_limit import rate_limiter
+
+# Default for the apps' "speculate" toggles; speculation is opt-in
+SPECULATION_ENABLED = os.environ.get("SPECULATION_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+class _Entry:
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.started_at = time.time()
+        self.claims = 0
+        self.cancel_event = threading.Event()
+
+
+class Speculator:
+    """Runs optional work ahead of a request the user is likely to make.
+
+    Results are parked under a key until `claim` picks them up. Claiming work
+    that is still running waits for it instead of starting a duplicate call.
+    Speculation runs on its own small pool so it never takes a job_runner
+    worker. It stops at a per-hour budget and pauses while the rate limiter has
+    real calls queued.
+
+    Args:
+        max_workers: Speculative jobs running at once
+        budget_per_hour: Speculative jobs started per rolling hour
+        ttl_seconds: How long an unclaimed result is kept before counting as wasted
+        max_entries: Parked results kept at most; the oldest are dropped first
+    """
+
+    def __init__(self, max_workers=2, budget_per_hour=30, ttl_seconds=3600, max_entries=256):
+        self.max_workers = max_workers
+        self.budget_per_hour = budget_per_hour
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._entries = OrderedDict()
+        self._started = deque()
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "skipped": 0, "used": 0, "hits": 0, "joined": 0, "misses": 0,
+                       "failed": 0, "cancelled": 0, "wasted": 0}
+
+    def speculate(self, key, fn, *args, cancellable=False, **kwargs):
+        """Start `fn(*args, **kwargs)` in the background under `key`.
+
+        Does nothing if `key` is already running or parked, the hourly budget is
+        spent, or the rate limiter is busy with real work.
+
+        Args:
+            key: Key the result is parked under
+            fn: Work to run
+            cancellable: Also pass fn a `cancel_event` (threading.Event) that
+                cancel sets, so multi-stage work can stop before its next stage
+
+        Returns:
+            True if the work was started
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if key in self._entries:
+                return False
+            while self._started and now - self._started[0] > 3600:
+                self._started.popleft()
+            if len(self._started) >= self.budget_per_hour or rate_limiter.stats()["queue_depth"] > 0:
+                self._stats["skipped"] += 1
+                return False
+            entry = _Entry(key)
+            self._entries[key] = entry
+            self._started.append(now)
+            self._stats["started"] += 1
+            if cancellable:
+                kwargs["cancel_event"] = entry.cancel_event
+            entry.future = self._executor.submit(contextvars.copy_context().run, self._run, key, fn, args, kwargs)
+            return True
+
+    def _run(self, key, fn, args, kwargs):
+        with tracing.span("speculate", trace_id=f"speculate-{key}", key=key):
+            return fn(*args, **kwargs)
+
+    def claim(self, key, timeout=None, keep=False):
+        """Take the result parked under `key`, waiting for it if still running.
+
+        Args:
+            key: Key passed to speculate
+            timeout: Seconds to wait for running work (None waits until done)
+            keep: Leave the result parked for later claims (e.g. shared warm-ups)
+
+        Returns:
+            The result, or None on a miss or if the speculative work failed
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if not keep:
+                del self._entries[key]
+            in_flight = not entry.future.done()
+        try:
+            result = entry.future.result(timeout)
+        except (CancelledError, Exception):
+            with self._lock:
+                self._stats["failed"] += 1
+                self._entries.pop(key, None)
+            return None
+        with self._lock:
+            if not entry.claims:
+                self._stats["used"] += 1
+            entry.claims += 1
+            self._stats["joined" if in_flight else "hits"] += 1
+        return result
+
+    def cancel(self, key):
+        """Drop speculative work.
+
+        Queued work never runs. Running work is told to stop through its
+        cancel_event (if it was started as cancellable), and its result is
+        discarded either way.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            entry.cancel_event.set()
+            entry.future.cancel()
+            self._stats["cancelled"] += 1
+            return True
+
+    def cancel_all(self, prefix=""):
+        """Cancel every key starting with `prefix`; returns how many were dropped."""
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+        return sum(self.cancel(key) for key in keys)
+
+    def _expire(self, now):
+        # Called with the lock held
+        for key, entry in list(self._entries.items()):
+            if len(self._entries) <= self.max_entries and now - entry.started_at <= self.ttl_seconds:
+                break
+            if not entry.future.done():
+                continue
+            del self._entries[key]
+            if not entry.claims:
+                self._stats["wasted"] += 1
+
+    def stats(self):
+        """Counters plus hit_rate (claims served by speculation) and useful_rate (share of started work that was used)."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["in_flight"] = sum(1 for entry in self._entries.values() if not entry.future.done())
+        served = snapshot["hits"] + snapshot["joined"]
+        claims = served + snapshot["misses"] + snapshot["failed"]
+        snapshot["hit_rate"] = served / claims if claims else 0.0
+        snapshot["useful_rate"] = snapshot["used"] / snapshot["started"] if snapshot["started"] else 0.0
+        return snapshot
+
+
+# One hourly budget for the whole process, however many sessions trigger speculation
+speculator = Speculator(
+    max_workers=int(os.environ.get("SPECULATION_WORKERS", "2")),
+    budget_per_hour=int(os.environ.get("SPECULATION_BUDGET_PER_HOUR", "30")),
+    ttl_seconds=float(os.environ.get("SPECULATION_TTL", "3600")),
+)
@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+
+# Stored values at least this large (in bytes of JSON) are zlib-compressed
+COMPRESS_MIN_BYTES = int(os.environ.get("STATE_COMPRESS_MIN_BYTES", "2048"))
+
+
+def pack_text(text):
+    """Column value for a string: zlib-compressed bytes from COMPRESS_MIN_BYTES, else the text itself."""
+    return zlib.compress(text.encode("utf-8")) if len(text) >= COMPRESS_MIN_BYTES else text
+
+
+def unpack_text(value):
+    """Inverse of pack_text."""
+    return zlib.decompress(value).decode("utf-8") if isinstance(value, bytes) else value
+
+
+def encode_blob(value):
+    """JSON-encode a value for a database column; large payloads come back as compressed bytes."""
+    return None if value is None else pack_text(json.dumps(value))
+
+
+def decode_blob(blob):
+    """Inverse of encode_blob; plain JSON text written before compression existed also decodes."""
+    return None if blob is None else json.loads(unpack_text(blob))
+
+
+class SQLiteDatabase:
+    """A SQLite file opened once per thread, used by the task, checkpoint and state stores.
+
+    The file runs in WAL mode, so job workers and other server processes can
+    read it while one of them writes. Nothing touches the disk until the first
+    query; the parent directory is created then if needed.
+
+    Args:
+        path: Database file
+        schema: SQL script run once when the database is first used (CREATE ... IF NOT EXISTS)
+        row_factory: Optional sqlite3 row factory for every connection, e.g. sqlite3.Row
+    """
+
+    def __init__(self, path, schema="", row_factory=None):
+        self.path = path
+        self.schema = schema
+        self.row_factory = row_factory
+        self._local = threading.local()
+        self._ready = False
+        self._setup_lock = threading.Lock()
+
+    def connection(self):
+        """This thread's connection, opened on first use (autocommit unless inside transaction)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._setup()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def _setup(self):
+        with self._setup_lock:
+            if self._ready:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                if self.schema:
+                    conn.executescript(self.schema)
+            finally:
+                conn.close()
+            self._ready = True
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one write transaction; nested blocks join the outermost one."""
+        conn = self.connection()
+        if self._local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.execute("COMMIT")
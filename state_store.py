@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_db import SQLiteDatabase, pack_text, unpack_text
+
+
+class StateBackend:
+    """Interface for durable session state.
+
+    Values are JSON text stored under (scope, key), where scope identifies a
+    user's session across processes (e.g. the owner or conversation id from the
+    URL). Every write bumps the entry's version, so a process can tell whether
+    its cached copy is still current without reading the value.
+    """
+
+    def version(self, scope, key):
+        """Current version of an entry, or None if it does not exist."""
+        raise NotImplementedError
+
+    def get(self, scope, key):
+        """Return (version, JSON text), or None."""
+        raise NotImplementedError
+
+    def put(self, scope, key, text):
+        """Store JSON text and return the new version."""
+        raise NotImplementedError
+
+    def delete(self, scope, key=None):
+        """Remove one entry, or every entry of the scope if key is None."""
+        raise NotImplementedError
+
+
+class MemoryStateBackend(StateBackend):
+    """Per-process backend: state is lost on restart and not shared (single-process deployments)."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def version(self, scope, key):
+        entry = self._entries.get((scope, key))
+        return entry[0] if entry is not None else None
+
+    def get(self, scope, key):
+        return self._entries.get((scope, key))
+
+    def put(self, scope, key, text):
+        with self._lock:
+            version = self.version(scope, key) or 0
+            self._entries[(scope, key)] = (version + 1, text)
+            return version + 1
+
+    def delete(self, scope, key=None):
+        with self._lock:
+            for entry in [entry for entry in self._entries if entry[0] == scope and key in (None, entry[1])]:
+                del self._entries[entry]
+
+
+class SQLiteStateBackend(StateBackend):
+    """SQLite backend shared by every server process pointed at the same file.
+
+    Values of COMPRESS_MIN_BYTES or more are stored zlib-compressed.
+    """
+
+    def __init__(self, path):
+        self.db = SQLiteDatabase(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS session_state (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (scope, key)
+            );
+            """,
+        )
+
+    def version(self, scope, key):
+        row = self.db.execute(
+            "SELECT version FROM session_state WHERE scope = ? AND key = ?", (scope, key)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def get(self, scope, key):
+        row = self.db.execute(
+            "SELECT version, value FROM session_state WHERE scope = ? AND key = ?", (scope, key)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], unpack_text(row[1])
+
+    def put(self, scope, key, text):
+        return self.db.execute(
+            """INSERT INTO session_state (scope, key, value, version, updated_at) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (scope, key) DO UPDATE SET value = excluded.value, version = version + 1, updated_at = excluded.updated_at
+            RETURNING version""",
+            (scope, key, pack_text(text), time.time()),
+        ).fetchone()[0]
+
+    def delete(self, scope, key=None):
+        if key is None:
+            self.db.execute("DELETE FROM session_state WHERE scope = ?", (scope,))
+        else:
+            self.db.execute("DELETE FROM session_state WHERE scope = ? AND key = ?", (scope, key))
+
+
+class StateStore:
+    """Write-through cache in front of a StateBackend.
+
+    Recently used entries are kept in memory as JSON text together with their
+    version. A read only fetches the value from the backend if another process
+    has written a newer version, and a write that would store the same JSON
+    again is skipped.
+
+    Args:
+        backend: StateBackend the values are written through to
+        max_entries: Entries kept in memory; least recently used are dropped first
+    """
+
+    def __init__(self, backend, max_entries=256):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"reads": 0, "memory_hits": 0, "writes": 0, "unchanged": 0}
+
+    def get(self, scope, key, default=None):
+        """Return the stored value, or `default`."""
+        version = self.backend.version(scope, key)
+        with self._lock:
+            self._stats["reads"] += 1
+            cached = self._memory.get((scope, key))
+            if version is not None and cached is not None and cached[0] == version:
+                self._memory.move_to_end((scope, key))
+                self._stats["memory_hits"] += 1
+                return json.loads(cached[1])
+        entry = self.backend.get(scope, key) if version is not None else None
+        if entry is None:
+            return default
+        self._remember(scope, key, *entry)
+        return json.loads(entry[1])
+
+    def put(self, scope, key, value):
+        """Write a JSON-serializable value through to the backend."""
+        text = json.dumps(value)
+        with self._lock:
+            cached = self._memory.get((scope, key))
+            if cached is not None and cached[1] == text and self.backend.version(scope, key) == cached[0]:
+                self._stats["unchanged"] += 1
+                return
+        version = self.backend.put(scope, key, text)
+        with self._lock:
+            self._stats["writes"] += 1
+        self._remember(scope, key, version, text)
+
+    def delete(self, scope, key=None):
+        with self._lock:
+            for entry in [entry for entry in self._memory if entry[0] == scope and key in (None, entry[1])]:
+                del self._memory[entry]
+        self.backend.delete(scope, key)
+
+    def hydrate(self, session, scope, name, default=None, decode=None):
+        """Load session[name] from the store the first time a session needs it.
+
+        Args:
+            session: st.session_state (or any mutable mapping)
+            scope: Scope the value is stored under
+            name: Session state key, also used as the stored key
+            default: Factory for the value when nothing is stored, e.g. list
+            decode: Optional function turning the stored JSON value back into an object
+        """
+        if name in session:
+            return
+        value = self.get(scope, name)
+        if value is None:
+            session[name] = default() if default is not None else None
+        else:
+            session[name] = decode(value) if decode is not None else value
+
+    def persist(self, session, scope, name, encode=None):
+        """Write session[name] through to the store (call after changing it)."""
+        value = session[name]
+        self.put(scope, name, encode(value) if encode is not None and value is not None else value)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["memory_entries"] = len(self._memory)
+        snapshot["hit_rate"] = snapshot["memory_hits"] / snapshot["reads"] if snapshot["reads"] else 0.0
+        return snapshot
+
+    def _remember(self, scope, key, version, text):
+        with self._lock:
+            self._memory[(scope, key)] = (version, text)
+            self._memory.move_to_end((scope, key))
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+
+def create_state_backend():
+    """Backend selected by STATE_BACKEND: "sqlite" (default, STATE_DB_PATH) or "memory"."""
+    if os.environ.get("STATE_BACKEND", "sqlite").lower() == "memory":
+        return MemoryStateBackend()
+    return SQLiteStateBackend(os.environ.get("STATE_DB_PATH", os.path.join("data", "state.sqlite3")))
+
+
+# Opens its SQLite file on first use, not on import
+state_store = StateStore(create_state_backend(), max_entries=int(os.environ.get("STATE_CACHE_ENTRIES", "256")))
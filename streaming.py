@@ -0,0 +1,121 @@
+import re
+import time
+
+# Matches the opening of a JSON string field, e.g. `"report": "`
+_FIELD_PATTERN = '"{}"\\s*:\\s*"'
+
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class StreamTimer:
+    """Records time-to-first-token and total latency of a streamed model call."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+
+    def mark_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def stop(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def ttft(self):
+        """Seconds until the first non-empty chunk arrived, or None."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def total(self):
+        """Seconds from the request to the last chunk (or until now if still running)."""
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def as_dict(self):
+        return {"ttft": self.ttft, "latency": self.total}
+
+
+def stream_text(response, timer=None):
+    """Yield the text of each chunk of a streamed `generate_content` response.
+
+    Args:
+        response: Response returned by `generate_content(..., stream=True)`
+        timer: Optional StreamTimer updated as chunks arrive
+
+    Yields:
+        Non-empty text chunks in arrival order
+    """
+    try:
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. a final safety/finish chunk)
+                continue
+            if not text:
+                continue
+            if timer:
+                timer.mark_token()
+            yield text
+    finally:
+        if timer:
+            timer.stop()
+
+
+def partial_json_string(buffer, field):
+    """Decode the value of a string field from a possibly incomplete JSON document.
+
+    Used to render a field such as `report` while the rest of the JSON object is
+    still streaming in. Escapes that are cut off at the end of the buffer are
+    dropped until the next chunk completes them.
+
+    Args:
+        buffer: JSON text received so far (may be wrapped in code fences)
+        field: Name of the string field to extract
+
+    Returns:
+        The decoded value received so far, or None if the field has not started
+    """
+    match = re.search(_FIELD_PATTERN.format(re.escape(field)), buffer)
+    if not match:
+        return None
+
+    out = []
+    i = match.end()
+    while i < len(buffer):
+        char = buffer[i]
+        if char == '"':
+            break
+        if char != "\\":
+            out.append(char)
+            i += 1
+            continue
+        if i + 1 >= len(buffer):
+            break
+        code = buffer[i + 1]
+        if code == "u":
+            digits = buffer[i + 2:i + 6]
+            if len(digits) < 4:
+                break
+            try:
+                out.append(chr(int(digits, 16)))
+            except ValueError:
+                pass
+            i += 6
+            continue
+        out.append(_ESCAPES.get(code, code))
+        i += 2
+    return "".join(out)
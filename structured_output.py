@@ -0,0 +1,144 @@
+import json
+import re
+import threading
+
+from pydantic import ValidationError
+
+import routing
+from llm import generate_text, invalidate
+
+_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+_stats_lock = threading.Lock()
+parse_stats = {"calls": 0, "parsed": 0, "repaired": 0, "failed": 0, "retries": 0}
+
+
+def _count(name):
+    with _stats_lock:
+        parse_stats[name] += 1
+
+
+def json_config(schema_cls):
+    """Generation config that constrains output to JSON matching a pydantic model."""
+    return {"response_mime_type": "application/json", "response_schema": schema_cls}
+
+
+def extract_json(text):
+    """Parse a JSON value out of model output, tolerating common formatting slips.
+
+    Handles output wrapped in ``` fences, prose before the object, and trailing
+    text after it, so a slightly malformed response does not cost another call.
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        Tuple of (parsed value, repaired) where repaired is True if the text was
+        not valid JSON as-is
+
+    Raises:
+        ValueError: If no JSON object or array can be found
+    """
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    candidates = [match.group(1) for match in _FENCE_PATTERN.finditer(text)]
+    candidates.append(text)
+    decoder = json.JSONDecoder()
+    for candidate in candidates:
+        for start, char in enumerate(candidate):
+            if char not in "{[":
+                continue
+            try:
+                value, _ = decoder.raw_decode(candidate, start)
+                return value, True
+            except json.JSONDecodeError:
+                continue
+    raise ValueError("No JSON value found in model output")
+
+
+def parse_structured(text, schema_cls):
+    """Parse and validate model output against a pydantic model.
+
+    Returns:
+        An instance of schema_cls, or None if the output cannot be used
+    """
+    _count("calls")
+    try:
+        data, repaired = extract_json(text)
+        result = schema_cls(**data)
+    except (ValueError, TypeError, ValidationError):
+        _count("failed")
+        return None
+    _count("repaired" if repaired else "parsed")
+    return result
+
+
+def generate_structured(model, prompt, schema_cls, retries=1, bypass_cache=False, stage="llm"):
+    """Generate JSON output constrained to a pydantic model's schema.
+
+    Unusable responses are evicted from the response cache and the call is
+    retried up to `retries` more times. If `model` is a ModelRouter on a
+    cascade route, each cheaper model gets one attempt before escalating; the
+    retries are spent on the route's last model.
+
+    Args:
+        model: Model (or ModelRouter) used for the call
+        prompt: Prompt string
+        schema_cls: Pydantic model describing the expected object
+        retries: Extra attempts after a response that cannot be parsed
+        bypass_cache: Skip the response cache for these calls
+        stage: Span name for tracing
+
+    Returns:
+        An instance of schema_cls, or None if every attempt failed
+    """
+    route, tiers = routing.resolve(model, stage)
+    if route is None:
+        return _generate_structured(model, prompt, schema_cls, retries, bypass_cache, stage)
+    with routing.decision(route, stage) as decision:
+        for i, tier in enumerate(tiers):
+            decision.use(tier)
+            last = i == len(tiers) - 1
+            try:
+                result = _generate_structured(tier, prompt, schema_cls, retries if last else 0, bypass_cache, stage)
+            except Exception as e:
+                if last:
+                    raise
+                decision.escalate(f"error {type(e).__name__}")
+                continue
+            if result is not None:
+                return result
+            if not last:
+                decision.escalate("schema validation failed")
+        decision.failed = True
+        return None
+
+
+def _generate_structured(model, prompt, schema_cls, retries, bypass_cache, stage):
+    config = json_config(schema_cls)
+    for attempt in range(retries + 1):
+        if attempt:
+            _count("retries")
+        text = generate_text(model, prompt, generation_config=config, bypass_cache=bypass_cache, stage=stage)
+        result = parse_structured(text, schema_cls)
+        if result is not None:
+            return result
+        invalidate(model, prompt, config)
+    return None
+
+
+def record_retry():
+    _count("retries")
+
+
+def stats():
+    """Return a snapshot of the parse counters with failure and retry rates."""
+    with _stats_lock:
+        snapshot = dict(parse_stats)
+    calls = snapshot["calls"]
+    snapshot["failure_rate"] = snapshot["failed"] / calls if calls else 0.0
+    snapshot["retry_rate"] = snapshot["retries"] / calls if calls else 0.0
+    return snapshot
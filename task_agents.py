@@ -0,0 +1,126 @@
+from pydantic import BaseModel
+
+import tracing
+from llm import generate_text
+from structured_output import generate_structured
+
+
+# Define data models
+class TaskPlan(BaseModel):
+    plan: str
+    sources: list[str]
+    steps: list[str]
+
+
+# Agent templates offered when creating a task
+AGENT_TEMPLATES = {
+    "Research Brief": "Create a research brief on the given topic with key points, sources, and summary.",
+    "Summarization": "Summarize the provided text or topic into key points and main ideas.",
+    "Study Plan": "Create a study plan for the given subject with timeline, resources, and milestones."
+}
+
+
+def default_plan(task):
+    """Generic plan used when the model's plan cannot be parsed."""
+    return {
+        "plan": f"Execute {task['template']} for: {task['description'][:100]}...",
+        "sources": [
+            f"Primary source: {task['description'][:200]}...",
+            "General knowledge base for AI and autonomous agents",
+            "Academic papers on multi-agent systems"
+        ],
+        "steps": [
+            "Step 1: Analyze the input content and identify key themes",
+            "Step 2: Extract relevant information and structure findings",
+            "Step 3: Generate comprehensive output based on template requirements",
+            "Step 4: Review and validate results for accuracy"
+        ]
+    }
+
+
+def generate_plan(model, task):
+    """Ask the triage agent for an execution plan for a task.
+
+    Args:
+        model: Model used for the call
+        task: Task dict with template and description
+
+    Returns:
+        Tuple of (plan dict, used_default) where used_default is True if the
+        model output could not be parsed and the generic plan was used instead
+    """
+    prompt = f"""
+    You are a triage agent for {task['template']} tasks.
+    Task: {task['description']}
+
+    Create a detailed execution plan with specific steps, relevant sources, and expected outcomes.
+    For {task['template']} tasks, focus on:
+    - Research Brief: Key research areas, data sources, analysis methods
+    - Summarization: Analysis approach, key extraction, summary structure
+    - Study Plan: Learning objectives, timeline, resources, assessment
+
+    Respond ONLY with a valid JSON object in this exact format:
+    {{
+        "plan": "Detailed description of the execution strategy and approach",
+        "sources": ["Source 1: brief description", "Source 2: brief description"],
+        "steps": ["Step 1: detailed action", "Step 2: detailed action", "Step 3: detailed action"]
+    }}
+
+    Make steps actionable and specific. Sources should be relevant to the task.
+    """
+    plan = generate_structured(model, prompt, TaskPlan, stage="plan")
+    if plan is None:
+        return default_plan(task), True
+    return plan.model_dump(), False
+
+
+def execute_task(model, task):
+    """Run an approved task against its plan and return the result text."""
+    prompt = f"""
+    You are an AI agent for {task['template']}.
+    Task: {task['description']}
+    Plan: {task['plan']}
+
+    Execute the task and provide the final result.
+    Respond ONLY with a valid JSON object in this exact format:
+    {{
+        "title": "Report Title",
+        "outline": ["section1", "section2"],
+        "report": "full detailed report in markdown",
+        "sources": ["source1", "source2"],
+        "word_count": 1234
+    }}
+    """
+    return generate_text(model, prompt, stage="execute")
+
+
+# Worker entry points: these run on the job runner and advance the task lifecycle
+def plan_task(model, store, task_id, speculator=None):
+    """Generate a plan and move the task from Created to Plan Generated.
+
+    If a speculator was given and a plan for this task was pre-generated (or is
+    still being generated) under "plan:<task_id>", that plan is used instead of
+    making another call.
+
+    Returns:
+        True if the generic fallback plan was used
+    """
+    with tracing.span("plan_task", trace_id=task_id) as span:
+        task = store.get(task_id)
+        speculative = speculator.claim(f"plan:{task_id}") if speculator else None
+        span.set(speculative_hit=speculative is not None)
+        if speculative is not None:
+            plan, used_default = speculative
+        else:
+            plan, used_default = generate_plan(model, task)
+        store.update(task_id, plan=plan, status='Plan Generated')
+    return used_default
+
+
+def run_task(model, store, task_id):
+    """Execute an approved task and move it to Completed."""
+    with tracing.span("execute_task", trace_id=task_id):
+        task = store.get(task_id)
+        result = execute_task(model, task)
+        store.update(task_id, result=result, status='Completed')
+    return result
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlite_db import SQLiteDatabase, decode_blob, encode_blob
+
+# Columns loaded for list views; plan/result blobs are only read by get()
+SUMMARY_COLUMNS = ("id", "owner", "name", "description", "template", "status", "approved", "created_at")
+BLOB_COLUMNS = ("plan", "result")
+UPDATABLE_COLUMNS = ("name", "description", "template", "status", "approved", "plan", "result")
+
+
+class TaskStore:
+    """SQLite-backed task repository.
+
+    Tasks are indexed by owner + status and owner + created_at so list views stay
+    cheap no matter how many tasks a user builds up. Plan and result blobs are
+    stored as JSON (zlib-compressed once they reach STATE_COMPRESS_MIN_BYTES)
+    and only loaded when a single task is opened.
+    """
+
+    def __init__(self, path):
+        self.db = SQLiteDatabase(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                template TEXT NOT NULL,
+                status TEXT NOT NULL,
+                approved INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                plan TEXT,
+                result TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_owner_status ON tasks (owner, status);
+            CREATE INDEX IF NOT EXISTS idx_tasks_owner_created_at ON tasks (owner, created_at);
+            """,
+            row_factory=sqlite3.Row,
+        )
+
+    @contextmanager
+    def batch(self):
+        """Group several writes into a single transaction.
+
+        Nested batches join the outermost transaction.
+        """
+        with self.db.transaction():
+            yield self
+
+    def create(self, owner, task):
+        """Insert a new task dict (as built by the Create Task form)."""
+        now = datetime.now().isoformat()
+        created_at = task.get("created_at") or datetime.now()
+        with self.batch():
+            self.db.execute(
+                """INSERT INTO tasks (id, owner, name, description, template, status, approved, created_at, updated_at, plan, result)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    task["id"], owner, task["name"], task["description"], task["template"], task["status"],
+                    int(bool(task.get("approved"))), created_at.isoformat(), now,
+                    encode_blob(task.get("plan")), encode_blob(task.get("result")),
+                ),
+            )
+
+    def get(self, task_id, owner=None):
+        """Load a full task, including its plan and result, or None.
+
+        With `owner`, another owner's task is treated as missing, like in
+        list_tasks and count; worker jobs, which only get task ids their
+        owner submitted, leave it out.
+        """
+        if owner is None:
+            row = self.db.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        else:
+            row = self.db.execute("SELECT * FROM tasks WHERE id = ? AND owner = ?", (task_id, owner)).fetchone()
+        return _to_task(row) if row is not None else None
+
+    def update(self, task_id, **fields):
+        """Update columns of one task (plan/result are JSON-encoded)."""
+        unknown = set(fields) - set(UPDATABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown task fields: {sorted(unknown)}")
+        values = {key: _encode(key, value) for key, value in fields.items()}
+        assignments = ", ".join(f"{key} = ?" for key in values)
+        self.db.execute(
+            f"UPDATE tasks SET {assignments}, updated_at = ? WHERE id = ?",
+            (*values.values(), datetime.now().isoformat(), task_id),
+        )
+
+    def list_tasks(self, owner, limit=20, offset=0, status=None):
+        """List task summaries (no plan/result) newest first, one page at a time."""
+        columns = ", ".join(SUMMARY_COLUMNS)
+        if status is None:
+            rows = self.db.execute(
+                f"SELECT {columns} FROM tasks WHERE owner = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (owner, limit, offset),
+            ).fetchall()
+        else:
+            rows = self.db.execute(
+                f"SELECT {columns} FROM tasks WHERE owner = ? AND status = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (owner, status, limit, offset),
+            ).fetchall()
+        return [_to_task(row) for row in rows]
+
+    def count(self, owner, status=None):
+        if status is None:
+            query, params = "SELECT COUNT(*) FROM tasks WHERE owner = ?", (owner,)
+        else:
+            query, params = "SELECT COUNT(*) FROM tasks WHERE owner = ? AND status = ?", (owner, status)
+        return self.db.execute(query, params).fetchone()[0]
+
+
+def _encode(key, value):
+    if key in BLOB_COLUMNS:
+        return encode_blob(value)
+    if key == "approved":
+        return int(bool(value))
+    return value
+
+
+def _to_task(row):
+    task = dict(row)
+    task.pop("updated_at", None)
+    task["approved"] = bool(task["approved"])
+    task["created_at"] = datetime.fromisoformat(task["created_at"])
+    for key in BLOB_COLUMNS:
+        if key in task:
+            task[key] = decode_blob(task[key])
+    return task
+
+
+task_store = TaskStore(os.environ.get("TASK_DB_PATH", os.path.join("data", "tasks.sqlite3")))
@@ -0,0 +1,99 @@
+import pytest
+
+import chat_context
+from chat_context import ChatMemory, build_chat_contents, compact_chat_memory
+
+
+def turns(count, size=400):
+    """Alternating user/assistant messages of about size / 4 tokens each."""
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i}:" + "x" * size}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    sent = []
+
+    def generate_text(model, prompt, **kwargs):
+        sent.append((prompt, kwargs.get("stage")))
+        return f" summary {len(sent)} "
+
+    monkeypatch.setattr(chat_context, "generate_text", generate_text)
+    return sent
+
+
+def test_no_summary_below_high_water(prompts):
+    memory = ChatMemory()
+    assert not compact_chat_memory(None, turns(6), memory, token_budget=1000)
+    assert prompts == [] and memory.summarized == 0
+
+
+def test_compaction_folds_oldest_turns_down_to_low_water(prompts):
+    history = turns(10)
+    memory = ChatMemory()
+    assert compact_chat_memory(None, history, memory, token_budget=1000)
+    assert len(prompts) == 1 and prompts[0][1] == "chat.summary"
+    assert memory.summary == "summary 1"
+    recent = history[memory.summarized:]
+    assert len(recent) >= 4
+    assert sum(chat_context._message_tokens(m) for m in recent) <= 1000 * chat_context.LOW_WATER
+    # Only the folded turns are sent to the summarizer
+    assert "0:" in prompts[0][0] and f"{memory.summarized}:" not in prompts[0][0]
+
+
+def test_compaction_keeps_min_recent_turns(prompts):
+    history = turns(6, size=4000)
+    memory = ChatMemory()
+    compact_chat_memory(None, history, memory, token_budget=1000, min_recent=4)
+    assert memory.summarized == 2
+
+
+def test_error_replies_are_not_summarized_or_sent(prompts):
+    history = turns(9)
+    history.insert(1, {"role": "assistant", "content": "Error: 429 quota exceeded"})
+    memory = ChatMemory()
+    compact_chat_memory(None, history, memory, token_budget=1000)
+    assert "Error:" not in prompts[0][0]
+    history.append({"role": "assistant", "content": "Error: timeout"})
+    history.append({"role": "user", "content": "again"})
+    contents, _ = build_chat_contents(history, ChatMemory(), token_budget=10000)
+    assert all("Error:" not in part for content in contents for part in content["parts"])
+
+
+def test_contents_start_with_summary_and_alternate_roles():
+    history = [
+        {"role": "user", "content": "first"},
+        {"role": "assistant", "content": "Error: boom"},
+        {"role": "user", "content": "second"},
+        {"role": "assistant", "content": "answer"},
+        {"role": "user", "content": "third"},
+    ]
+    contents, stats = build_chat_contents(history, ChatMemory("earlier facts", summarized=0), token_budget=1000)
+    assert [c["role"] for c in contents] == ["user", "model", "user", "model", "user"]
+    assert "earlier facts" in contents[0]["parts"][0]
+    assert contents[2]["parts"] == ["first\n\nsecond"]
+    assert stats["recent_messages"] == 4
+
+
+def test_budget_drops_oldest_but_always_sends_newest():
+    history = turns(6)
+    contents, stats = build_chat_contents(history, ChatMemory(), token_budget=250)
+    assert stats["recent_messages"] == 2 and contents[-1]["parts"][0].startswith("5:")
+    huge = [{"role": "user", "content": "y" * 8000}]
+    contents, stats = build_chat_contents(huge, ChatMemory(), token_budget=100)
+    assert stats["recent_messages"] == 1 and stats["tokens"] > 100
+
+
+def test_summarized_turns_are_not_resent():
+    history = turns(6)
+    contents, stats = build_chat_contents(history, ChatMemory("s", summarized=4), token_budget=10000)
+    assert stats["recent_messages"] == 2 and stats["summarized_messages"] == 4
+    assert not any(part.startswith(("0:", "3:")) for content in contents for part in content["parts"])
+
+
+def test_memory_round_trips_through_dict():
+    memory = ChatMemory.from_dict(ChatMemory("s", 3).to_dict())
+    assert (memory.summary, memory.summarized) == ("s", 3)
+    assert ChatMemory.from_dict({}).summarized == 0
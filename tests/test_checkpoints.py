@@ -0,0 +1,82 @@
+import pytest
+
+import research_pipeline
+from checkpoints import CheckpointStore
+from research_pipeline import ResearchPlan, ResearchReport
+
+QUERIES = ["solar panel efficiency records", "battery storage costs per kWh", "grid interconnection queue delays"]
+SUMMARIES = {
+    QUERIES[0]: "Perovskite tandem cells passed 33% in lab conditions while commercial modules sit near 22%.",
+    QUERIES[1]: "Lithium iron phosphate pack prices fell below $100/kWh; sodium-ion is entering stationary storage.",
+    QUERIES[2]: "Interconnection backlogs exceed 2 TW in the US with median waits of five years before operation.",
+}
+
+
+class FakePipeline:
+    """Stands in for the model-calling agents and records which stages ran."""
+
+    def __init__(self, monkeypatch, failing=()):
+        self.triaged = 0
+        self.researched = []
+        self.failing = set(failing)
+        monkeypatch.setattr(research_pipeline, "triage_agent", self.triage_agent)
+        monkeypatch.setattr(research_pipeline, "research_agent", self.research_agent)
+        monkeypatch.setattr(research_pipeline, "editor_agent", self.editor_agent)
+
+    def triage_agent(self, model, topic, bypass_cache=False):
+        self.triaged += 1
+        return ResearchPlan(topic=topic, search_queries=QUERIES, focus_areas=["Costs"])
+
+    def research_agent(self, model, query, timeout=None, bypass_cache=False, index=None, cancel_event=None):
+        self.researched.append(query)
+        if query in self.failing:
+            raise RuntimeError("503 unavailable")
+        return SUMMARIES[query]
+
+    def editor_agent(self, model, topic, research_data, **kwargs):
+        return ResearchReport(title=topic, outline=[], report=research_data, sources=[], word_count=1)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints.sqlite3")).run("conv", "Energy")
+
+
+def test_retry_reruns_only_failed_queries(monkeypatch, checkpoint):
+    first = FakePipeline(monkeypatch, failing=[QUERIES[1]])
+    _, _, stats = research_pipeline.research_topic(None, "Energy", checkpoint=checkpoint)
+    assert first.triaged == 1 and stats["queries_failed"] == 1
+    assert checkpoint.get("report") is None
+
+    retry = FakePipeline(monkeypatch)
+    _, report, stats = research_pipeline.research_topic(None, "Energy", checkpoint=checkpoint)
+    assert retry.triaged == 0 and retry.researched == [QUERIES[1]]
+    assert stats["plan_resumed"] and stats["queries_resumed"] == 2 and stats["queries_failed"] == 0
+    assert all(summary in report.report for summary in SUMMARIES.values())
+    assert checkpoint.get("report") is not None
+
+
+def test_finished_run_starts_over(monkeypatch, checkpoint):
+    FakePipeline(monkeypatch)
+    research_pipeline.research_topic(None, "Energy", checkpoint=checkpoint)
+
+    again = FakePipeline(monkeypatch)
+    _, _, stats = research_pipeline.research_topic(None, "Energy", checkpoint=checkpoint)
+    assert again.triaged == 1 and sorted(again.researched) == sorted(QUERIES)
+    assert not stats["plan_resumed"] and stats["queries_resumed"] == 0
+
+
+def test_bypass_cache_discards_an_interrupted_run(monkeypatch, checkpoint):
+    FakePipeline(monkeypatch, failing=[QUERIES[0]])
+    research_pipeline.research_topic(None, "Energy", checkpoint=checkpoint)
+
+    fresh = FakePipeline(monkeypatch)
+    research_pipeline.research_topic(None, "Energy", checkpoint=checkpoint, bypass_cache=True)
+    assert fresh.triaged == 1 and sorted(fresh.researched) == sorted(QUERIES)
+
+
+def test_run_id_ignores_topic_case_and_whitespace(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    store.run("conv", "Energy").put("plan", {"topic": "Energy"})
+    assert store.run("conv", "  energy ").get("plan") == {"topic": "Energy"}
+    assert store.run("other", "Energy").get("plan") is None
@@ -0,0 +1,47 @@
+import pytest
+
+from dedup import DEDUP_THRESHOLD, QUERY_DEDUP_THRESHOLD, dedupe_queries, dedupe_texts
+
+SUMMARY = ("Lithium iron phosphate pack prices fell below 100 dollars per kWh in 2024, driven by overcapacity in "
+           "Chinese cell manufacturing. Sodium-ion chemistries are entering stationary storage at lower cost.")
+
+
+def test_query_formatting_differences_are_merged():
+    queries = ["Best espresso machines under $500", "best espresso machines under 500?", "espresso grinder reviews"]
+    unique, report = dedupe_queries(queries)
+    assert unique == [queries[0], queries[2]]
+    assert report["merged"] == [(queries[1], queries[0])] and report["calls_saved"] == 1
+
+
+@pytest.mark.parametrize("a, b", [
+    ("solar incentives in California", "solar incentives in Texas"),
+    ("EV sales 2023", "EV sales 2024"),
+    ("cruise lines for families", "cruise lines for seniors"),
+])
+def test_queries_differing_in_one_key_word_are_kept(a, b):
+    unique, _ = dedupe_queries([a, b])
+    assert unique == [a, b]
+
+
+def test_query_threshold_is_stricter_than_text_threshold():
+    assert QUERY_DEDUP_THRESHOLD > DEDUP_THRESHOLD
+
+
+def test_near_duplicate_summaries_collapse():
+    reworded = SUMMARY.replace("fell below", "dropped under")
+    kept, report = dedupe_texts([SUMMARY, reworded, "Interconnection queues exceed two terawatts in the US."])
+    assert kept == [SUMMARY, "Interconnection queues exceed two terawatts in the US."]
+    assert report["collapsed"] == 1 and report["prompt_tokens_saved"] > 0
+
+
+def test_threshold_one_merges_only_identical_text():
+    reworded = SUMMARY.replace("fell below", "dropped under")
+    kept, report = dedupe_texts([SUMMARY, reworded, SUMMARY.upper()], threshold=1.0)
+    assert kept == [SUMMARY, reworded]
+    assert report["collapsed"] == 1
+
+
+def test_lower_threshold_merges_more():
+    texts = [SUMMARY, SUMMARY.split(". ")[0] + "."]
+    assert len(dedupe_texts(texts, threshold=DEDUP_THRESHOLD)[0]) == 2
+    assert len(dedupe_texts(texts, threshold=0.3)[0]) == 1
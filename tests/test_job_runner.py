@@ -0,0 +1,58 @@
+import threading
+
+import job_runner
+from job_runner import DONE, FAILED, JobRunner
+
+
+def wait(job):
+    job.future.result(timeout=5)
+
+
+def test_counts_follow_job_states():
+    runner = JobRunner(max_workers=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocked():
+        started.set()
+        release.wait(5)
+
+    first = runner.submit("a", "plan", blocked)
+    second = runner.submit("b", "plan", lambda: None)
+    started.wait(5)
+    assert runner.running_count() == 1 and runner.queue_depth() == 1
+    release.set()
+    wait(first)
+    wait(second)
+    assert runner.running_count() == 0 and runner.queue_depth() == 0
+    assert first.state == DONE and second.state == DONE
+
+
+def test_failed_job_keeps_error():
+    runner = JobRunner(max_workers=1)
+    job = runner.submit("a", "execute", lambda: {}["missing"])
+    wait(job)
+    assert job.state == FAILED and "missing" in job.error
+
+
+def test_finished_jobs_are_evicted_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_runner.time, "time", lambda: now[0])
+    runner = JobRunner(max_workers=1, ttl_seconds=60)
+    wait(runner.submit("old", "plan", lambda: None))
+    now[0] += 30
+    wait(runner.submit("new", "plan", lambda: None))
+    now[0] += 40
+    assert runner.get("old") is None
+    assert runner.get("new").state == DONE
+
+
+def test_resubmitted_job_is_not_evicted_with_its_predecessor(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_runner.time, "time", lambda: now[0])
+    runner = JobRunner(max_workers=1, ttl_seconds=60)
+    wait(runner.submit("a", "plan", lambda: None))
+    now[0] += 50
+    wait(runner.submit("a", "execute", lambda: None))
+    now[0] += 20
+    assert runner.get("a").kind == "execute"
@@ -0,0 +1,107 @@
+import pytest
+
+import llm_cache
+from llm_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_cache.time, "time", fake.time)
+    return fake
+
+
+def test_key_hot_in_memory_survives_disk_trim(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_memory_entries=100, max_disk_entries=3)
+    cache.put("hot", "m", "popular")
+    for i in range(2):
+        clock.now += 10
+        cache.put(f"cold{i}", "m", f"r{i}")
+    # Served from memory for a few minutes; the access time reaches disk about once a minute
+    for _ in range(30):
+        clock.now += 10
+        assert cache.get("hot") == "popular"
+    clock.now += 10
+    # Over the limit: the least recently accessed entry on disk goes
+    cache.put("new", "m", "r")
+    keys = {row[0] for row in cache._conn.execute("SELECT key FROM responses")}
+    assert keys == {"hot", "cold1", "new"}
+
+
+def test_memory_hits_touch_disk_at_most_once_per_interval(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), touch_interval=60)
+    cache.put("k", "m", "v")
+    accessed = lambda: cache._conn.execute("SELECT accessed_at FROM responses WHERE key = 'k'").fetchone()[0]  # noqa: E731
+    written = clock.now
+    clock.now += 30
+    cache.get("k")
+    assert accessed() == written
+    clock.now += 30
+    cache.get("k")
+    assert accessed() == clock.now
+
+
+def test_expired_entries_miss_and_are_deleted(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path, ttl_seconds=100)
+    cache.put("k", "m", "v")
+    clock.now += 50
+    assert cache.get("k") == "v"
+    clock.now += 51
+    assert cache.get("k") is None
+    # A fresh process (empty memory tier) finds nothing on disk either
+    assert ResponseCache(path, ttl_seconds=100).stats()["disk_entries"] == 0
+
+
+def test_max_age_is_tighter_than_ttl(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=1000)
+    cache.put("k", "m", "v")
+    clock.now += 60
+    assert cache.get("k", max_age=30) is None
+    assert cache.get("k") == "v"
+
+
+def test_disk_hit_after_restart_fills_memory(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    ResponseCache(path).put("k", "m", "v")
+    cache = ResponseCache(path)
+    assert cache.get("k") == "v"
+    assert cache.get("k") == "v"
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1 and stats["hit_rate"] == 1.0
+
+
+def test_memory_tier_is_lru_bounded(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_memory_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, "m", key)
+    cache.get("a")
+    cache.put("c", "m", "c")
+    assert list(cache._memory) == ["a", "c"]
+    # The evicted key is still served from disk
+    assert cache.get("b") == "b"
+
+
+def test_trim_drops_expired_then_least_recently_accessed(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_memory_entries=1, max_disk_entries=3, ttl_seconds=100)
+    cache.put("stale", "m", "s")
+    clock.now += 90
+    cache.put("a", "m", "a")
+    clock.now += 5
+    cache.put("b", "m", "b")
+    clock.now += 20
+    cache.put("c", "m", "c")
+    keys = lambda: {row[0] for row in cache._conn.execute("SELECT key FROM responses")}  # noqa: E731
+    assert keys() == {"a", "b", "c"}
+    clock.now += 5
+    cache.put("d", "m", "d")
+    assert keys() == {"b", "c", "d"}
+    assert cache.stats()["evictions"] == 2
@@ -0,0 +1,184 @@
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, TokenBucket, is_rate_limit_error, retry_hint
+
+
+class RateLimitError(Exception):
+    code = 429
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limit.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_bucket_allows_burst_then_waits(clock):
+    bucket = TokenBucket(per_minute=60)
+    assert all(bucket.reserve(1) == 0.0 for _ in range(60))
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)
+
+
+def test_bucket_refills_over_time(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(60)
+    clock.now += 30
+    assert bucket.reserve(30) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+def test_bucket_caps_oversized_reservation(clock):
+    bucket = TokenBucket(per_minute=100)
+    assert bucket.reserve(1000) == 0.0
+    assert bucket.reserve(1) == pytest.approx(0.6)
+
+
+def test_bucket_adjust_charges_and_refunds(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(60)
+    bucket.adjust(-30)
+    assert bucket.reserve(30) == 0.0
+    bucket.adjust(60)
+    assert bucket.reserve(0) == pytest.approx(60.0)
+
+
+def test_aimd_halves_on_throttle_and_grows_back(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda a, b: 1.0)
+    limiter = RateLimiter(6000, 10**9, max_concurrency=8, max_retries=5, base_delay=1.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(len(attempts))
+        if len(attempts) <= 3:
+            raise RateLimitError("429 Resource exhausted")
+        return "ok"
+
+    assert limiter.call(flaky, estimated_tokens=10) == "ok"
+    stats = limiter.stats()
+    assert stats["throttled"] == 3 and stats["retries"] == 3
+    # 8 -> 4 -> 2 -> 1, then one success adds 1 / limit
+    assert limiter._limit == pytest.approx(2.0)
+    assert clock.slept == [1.0, 2.0, 4.0]
+
+    for _ in range(50):
+        limiter.call(lambda: None, estimated_tokens=10)
+    assert limiter.stats()["concurrency_limit"] == 8
+
+
+def throttled():
+    raise RateLimitError("429")
+
+
+def test_limit_never_drops_below_one(clock):
+    limiter = RateLimiter(6000, 10**9, max_concurrency=2, max_retries=0)
+    for _ in range(5):
+        with pytest.raises(RateLimitError):
+            limiter.call(throttled, estimated_tokens=1)
+    assert limiter._limit == 1.0
+
+
+def test_other_errors_are_not_retried_or_throttled(clock):
+    limiter = RateLimiter(6000, 10**9, max_concurrency=4)
+    with pytest.raises(KeyError):
+        limiter.call(lambda: {}["missing"], estimated_tokens=1)
+    stats = limiter.stats()
+    assert stats["throttled"] == 0 and stats["retries"] == 0 and stats["in_flight"] == 0
+
+
+def test_gives_up_after_max_retries(clock):
+    limiter = RateLimiter(6000, 10**9, max_concurrency=4, max_retries=2)
+    retries = []
+    with pytest.raises(RateLimitError):
+        limiter.call(throttled, estimated_tokens=1, on_retry=lambda: retries.append(1))
+    assert len(retries) == 2
+
+
+def test_backoff_respects_server_hint(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda a, b: 0.5)
+    limiter = RateLimiter(60, 10**6, max_concurrency=1, base_delay=1.0)
+    assert limiter.backoff(RateLimitError("429, retry in 12.5s"), attempt=0) == 12.5
+    assert limiter.backoff(RateLimitError("429"), attempt=3) == 4.0
+
+
+def test_usage_corrects_token_budget(clock):
+    limiter = RateLimiter(6000, tokens_per_minute=1000, max_concurrency=1)
+    limiter.call(lambda: "r", estimated_tokens=500, usage=lambda result: 100)
+    assert limiter.tokens.reserve(900) == 0.0
+
+
+
+def test_bucket_wait_counts_as_queued_without_holding_a_slot(clock, monkeypatch):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=10**9, max_concurrency=4)
+    limiter.requests.reserve(60)
+    seen = []
+
+    def sleep(seconds):
+        seen.append(limiter.stats())
+        clock.sleep(seconds)
+
+    monkeypatch.setattr(rate_limit.time, "sleep", sleep)
+    limiter.call(lambda: "r", estimated_tokens=1)
+    assert seen[0]["queue_depth"] == 1 and seen[0]["in_flight"] == 0
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_backoff_stops_at_deadline(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit.random, "uniform", lambda a, b: 1.0)
+    limiter = RateLimiter(6000, 10**9, max_concurrency=1, max_retries=5, base_delay=10.0)
+    with pytest.raises(RateLimitError):
+        limiter.call(throttled, estimated_tokens=1, deadline=clock.now + 3)
+    assert clock.slept == [3.0]
+
+
+@pytest.mark.parametrize("error, expected", [
+    (Exception("429 Resource has been exhausted (e.g. check quota). Please retry in 12.5s."), 12.5),
+    (Exception("quota exceeded\nretry_delay {\n  seconds: 30\n}"), 30.0),
+    (Exception("Too many requests. Retry-After: 7"), 7.0),
+    (Exception("retry after 2.5"), 2.5),
+    (Exception("429 Too Many Requests"), None),
+])
+def test_retry_hint_from_message(error, expected):
+    assert retry_hint(error) == expected
+
+
+def test_retry_hint_prefers_header():
+    error = Exception("retry in 3s")
+    error.response = SimpleNamespace(headers={"Retry-After": "9"})
+    assert retry_hint(error) == 9.0
+
+
+def test_retry_hint_ignores_unparseable_header():
+    error = Exception("retry in 3s")
+    error.response = SimpleNamespace(headers={"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"})
+    assert retry_hint(error) == 3.0
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RateLimitError("x"), True),
+    (SimpleNamespace(code=SimpleNamespace(value=429)), True),
+    (Exception("RESOURCE_EXHAUSTED"), True),
+    (Exception("Quota exceeded for metric"), True),
+    (Exception("500 Internal error"), False),
+    (ValueError("bad json"), False),
+])
+def test_is_rate_limit_error(error, expected):
+    assert is_rate_limit_error(error) is expected
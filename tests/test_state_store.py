@@ -0,0 +1,94 @@
+import pytest
+
+from sqlite_db import COMPRESS_MIN_BYTES, decode_blob, encode_blob
+from state_store import MemoryStateBackend, SQLiteStateBackend, StateStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateBackend()
+    return SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+
+
+def test_versions_increase_per_write(backend):
+    assert backend.version("s", "k") is None
+    assert backend.put("s", "k", '"a"') == 1
+    assert backend.put("s", "k", '"b"') == 2
+    assert backend.get("s", "k") == (2, '"b"')
+
+
+def test_unchanged_value_is_not_written_again(backend):
+    store = StateStore(backend)
+    store.put("s", "k", {"a": 1})
+    store.put("s", "k", {"a": 1})
+    assert backend.version("s", "k") == 1
+    assert store.stats()["unchanged"] == 1
+
+
+def test_read_uses_memory_until_another_process_writes(backend):
+    ours, theirs = StateStore(backend), StateStore(backend)
+    ours.put("s", "k", [1])
+    assert ours.get("s", "k") == [1]
+    assert ours.stats()["memory_hits"] == 1
+    theirs.put("s", "k", [1, 2])
+    assert ours.get("s", "k") == [1, 2]
+    assert ours.stats()["memory_hits"] == 1
+    # Our cached copy is stale, so writing the old value again is a real write
+    ours.put("s", "k", [1])
+    assert theirs.get("s", "k") == [1]
+
+
+def test_delete_scope(backend):
+    store = StateStore(backend)
+    store.put("s", "a", 1)
+    store.put("s", "b", 2)
+    store.put("t", "a", 3)
+    store.delete("s")
+    assert store.get("s", "a") is None and store.get("s", "b", default=0) == 0
+    assert store.get("t", "a") == 3
+
+
+def test_memory_tier_is_bounded(backend):
+    store = StateStore(backend, max_entries=2)
+    for key in "abc":
+        store.put("s", key, key)
+    assert store.stats()["memory_entries"] == 2
+    assert store.get("s", "a") == "a"
+
+
+def test_hydrate_and_persist():
+    store = StateStore(MemoryStateBackend())
+    session = {}
+    store.hydrate(session, "s", "history", default=list)
+    assert session["history"] == []
+    session["history"].append({"role": "user"})
+    store.persist(session, "s", "history")
+    restored = {}
+    store.hydrate(restored, "s", "history", default=list)
+    assert restored["history"] == [{"role": "user"}]
+
+
+def test_large_values_are_compressed(tmp_path):
+    backend = SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+    text = '"' + "x" * COMPRESS_MIN_BYTES + '"'
+    backend.put("s", "big", text)
+    stored = backend.db.execute("SELECT value FROM session_state WHERE key = 'big'").fetchone()[0]
+    assert isinstance(stored, bytes) and len(stored) < len(text)
+    assert backend.get("s", "big") == (1, text)
+
+
+def test_blob_round_trip():
+    assert decode_blob(encode_blob(None)) is None
+    value = {"plan": "y" * COMPRESS_MIN_BYTES}
+    assert isinstance(encode_blob(value), bytes)
+    assert decode_blob(encode_blob(value)) == value
+    assert decode_blob('{"plain": true}') == {"plain": True}
+
+
+def test_database_is_created_on_first_use(tmp_path):
+    path = tmp_path / "nested" / "state.sqlite3"
+    backend = SQLiteStateBackend(str(path))
+    assert not path.exists()
+    backend.put("s", "k", "1")
+    assert path.exists()
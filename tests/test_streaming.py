@@ -0,0 +1,77 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from streaming import StreamTimer, partial_json_string, stream_text
+
+
+class NoTextChunk:
+    @property
+    def text(self):
+        raise ValueError("no text parts")
+
+
+def test_stream_text_skips_empty_and_textless_chunks():
+    chunks = [SimpleNamespace(text="Hel"), SimpleNamespace(text=""), NoTextChunk(), SimpleNamespace(text="lo")]
+    timer = StreamTimer()
+    assert list(stream_text(chunks, timer)) == ["Hel", "lo"]
+    assert timer.ttft is not None and timer.finished_at is not None
+    assert timer.ttft <= timer.total
+
+
+def test_stream_timer_stops_when_the_stream_fails():
+    def chunks():
+        yield SimpleNamespace(text="partial")
+        raise RuntimeError("connection reset")
+
+    timer = StreamTimer()
+    with pytest.raises(RuntimeError):
+        list(stream_text(chunks(), timer))
+    assert timer.finished_at is not None
+
+
+def test_stream_timer_without_tokens_has_no_ttft():
+    timer = StreamTimer()
+    assert list(stream_text([], timer)) == []
+    assert timer.as_dict()["ttft"] is None
+
+
+def test_field_not_started():
+    assert partial_json_string('{"title": "T", "rep', "report") is None
+    assert partial_json_string("", "report") is None
+
+
+def test_complete_field_stops_at_closing_quote():
+    assert partial_json_string('{"report": "done", "title": "T"}', "report") == "done"
+
+
+def test_incomplete_field_returns_prefix():
+    assert partial_json_string('```json\n{"title": "T", "report": "# Heading\\n\\nFirst par', "report") == "# Heading\n\nFirst par"
+
+
+def test_whitespace_around_colon():
+    assert partial_json_string('{"report" :\n  "abc', "report") == "abc"
+
+
+def test_escapes_are_decoded():
+    assert partial_json_string(r'{"report": "a\"b\\c\/d\t\u00e9"}', "report") == 'a"b\\c/d\té'
+
+
+@pytest.mark.parametrize("buffer", [
+    '{"report": "line\\',
+    '{"report": "line\\u00',
+    '{"report": "line\\u',
+])
+def test_cut_off_escape_is_dropped(buffer):
+    assert partial_json_string(buffer, "report") == "line"
+
+
+def test_every_prefix_is_a_prefix_of_the_final_value():
+    value = 'Quote " backslash \\ newline \n unicode é tab \t end'
+    document = json.dumps({"title": "T", "report": value})
+    for cut in range(len(document) + 1):
+        partial = partial_json_string(document[:cut], "report")
+        if partial is not None:
+            assert value.startswith(partial)
+    assert partial_json_string(document, "report") == value
@@ -0,0 +1,53 @@
+import pytest
+from pydantic import BaseModel
+
+from structured_output import extract_json, parse_structured
+
+
+class Plan(BaseModel):
+    topic: str
+    steps: list[str]
+
+
+def test_plain_json_is_not_repaired():
+    assert extract_json('{"a": 1}') == ({"a": 1}, False)
+
+
+@pytest.mark.parametrize("text", [
+    '```json\n{"a": 1}\n```',
+    '```\n{"a": 1}\n```',
+    '```JSON\n{"a": 1}',
+])
+def test_fenced_json(text):
+    assert extract_json(text) == ({"a": 1}, True)
+
+
+def test_prose_before_and_trailing_text_after():
+    text = 'Here is the plan:\n{"a": [1, 2], "b": "x}"}\nLet me know if you need more.'
+    assert extract_json(text) == ({"a": [1, 2], "b": "x}"}, True)
+
+
+def test_array_value():
+    assert extract_json("Result: [1, 2, 3] done") == ([1, 2, 3], True)
+
+
+def test_skips_brace_that_does_not_start_valid_json():
+    assert extract_json('Use {braces} carefully: {"a": 1}') == ({"a": 1}, True)
+
+
+@pytest.mark.parametrize("text", [
+    '{"topic": "x", "steps": ["a", "b"',
+    '```json\n{"topic": "x", "steps": [',
+    "no json here",
+    "",
+])
+def test_truncated_or_missing_json_raises(text):
+    with pytest.raises(ValueError):
+        extract_json(text)
+
+
+def test_parse_structured_validates_schema():
+    assert parse_structured('```json\n{"topic": "t", "steps": ["a"]}\n```', Plan) == Plan(topic="t", steps=["a"])
+    assert parse_structured('{"topic": "t"}', Plan) is None
+    assert parse_structured('{"topic": "t", "steps": ["a"', Plan) is None
+    assert parse_structured('["not", "an", "object"]', Plan) is None
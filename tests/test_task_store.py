@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from task_store import TaskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TaskStore(str(tmp_path / "tasks.sqlite3"))
+
+
+def add(store, owner, task_id, status="Created", minutes=0):
+    store.create(owner, {
+        "id": task_id, "name": task_id, "description": "d", "template": "Summarization", "status": status,
+        "created_at": datetime(2026, 1, 1) + timedelta(minutes=minutes),
+    })
+
+
+def test_get_filters_on_owner(store):
+    add(store, "alice", "t1")
+    assert store.get("t1", owner="alice")["name"] == "t1"
+    assert store.get("t1", owner="bob") is None
+    assert store.get("t1")["owner"] == "alice"
+
+
+def test_update_encodes_blobs_and_rejects_unknown_fields(store):
+    add(store, "alice", "t1")
+    store.update("t1", plan={"steps": ["a"]}, approved=True, status="Approved")
+    task = store.get("t1")
+    assert task["plan"] == {"steps": ["a"]} and task["approved"] is True and task["status"] == "Approved"
+    with pytest.raises(ValueError):
+        store.update("t1", owner="bob")
+
+
+def test_list_and_count_are_per_owner_and_newest_first(store):
+    for minutes in range(5):
+        add(store, "alice", f"a{minutes}", status="Created" if minutes % 2 else "Approved", minutes=minutes)
+    add(store, "bob", "b0")
+    assert [task["id"] for task in store.list_tasks("alice", limit=2, offset=1)] == ["a3", "a2"]
+    assert store.count("alice") == 5 and store.count("alice", status="Created") == 2
+    assert "plan" not in store.list_tasks("alice")[0]
+
+
+def test_batch_rolls_back_on_error(store):
+    with pytest.raises(RuntimeError):
+        with store.batch():
+            add(store, "alice", "t1")
+            raise RuntimeError("boom")
+    assert store.count("alice") == 0
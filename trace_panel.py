@@ -0,0 +1,60 @@
+import altair as alt
+import streamlit as st
+
+import routing
+import tracing
+
+
+def render_trace_waterfall(trace_id):
+    """Draw a waterfall of the most recent run recorded under `trace_id`."""
+    spans = tracing.last_run(trace_id)
+    if not spans:
+        st.caption("No trace recorded yet.")
+        return
+
+    rows = []
+    for s in spans:
+        rows.append({
+            "span": " " * s["depth"] + s["name"],
+            "start": round(s["offset"], 3),
+            "end": round(s["offset"] + s["duration"], 3),
+            "duration_s": round(s["duration"], 3),
+            "kind": "cache hit" if s.get("cache_hit") else (s.get("kind") or "stage"),
+            "prompt_chars": s.get("prompt_chars"),
+            "response_chars": s.get("response_chars"),
+            "prompt_tokens": s.get("prompt_tokens"),
+            "output_tokens": s.get("output_tokens"),
+            "retries": s.get("retries"),
+            "error": s.get("error"),
+        })
+
+    chart = alt.Chart(alt.Data(values=rows)).mark_bar().encode(
+        x=alt.X("start:Q", title="seconds since start"),
+        x2="end:Q",
+        y=alt.Y("span:N", sort=None, title=None),
+        color=alt.Color("kind:N", title=None),
+        tooltip=["span:N", "duration_s:Q", "prompt_tokens:Q", "output_tokens:Q", "retries:Q"],
+    ).properties(height=max(120, 24 * len(rows)))
+    st.altair_chart(chart)
+
+    total_tokens = sum((s.get("prompt_tokens") or 0) + (s.get("output_tokens") or 0) for s in spans)
+    st.caption(f"Total {spans[0]['duration']:.2f}s · {len(spans) - 1} spans · {total_tokens} tokens")
+    st.dataframe(rows, hide_index=True)
+
+
+def render_route_table():
+    """Per-route call counts, escalations, models used and latency against the route's SLO."""
+    rows = []
+    for name, r in sorted(routing.stats().items()):
+        rows.append({
+            "route": name,
+            "calls": r["calls"],
+            "escalated": f"{r['escalation_rate']:.0%}",
+            "failed": r["failed"],
+            "models": ", ".join(f"{model} ×{count}" for model, count in r["models"].items()),
+            "p50_ms": round(r["p50_ms"]),
+            "p95_ms": round(r["p95_ms"]),
+            "slo_ms": round(r["slo_ms"]),
+            "within_slo": f"{r['slo_attainment']:.0%}",
+        })
+    st.dataframe(rows, hide_index=True)
@@ -0,0 +1,235 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+MAX_TRACES = 200
+MAX_SPANS_PER_TRACE = 1000
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_traces = OrderedDict()
+_metrics = defaultdict(float)
+
+_logger = logging.getLogger("agentic.traces")
+_logger.propagate = False
+
+
+class Span:
+    """One timed operation. Spans sharing a trace_id form a tree via parent_id."""
+
+    def __init__(self, name, trace_id, parent_id=None, **attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error=None):
+        """Finish the span and export it (idempotent)."""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.attrs["error"] = repr(error)[:300]
+        _record(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            **self.attrs,
+        }
+
+
+def start_span(name, trace_id=None, **attrs):
+    """Create a child of the current span without making it current.
+
+    Used where a `with` block cannot wrap the work, e.g. inside generators that
+    yield back to the caller. Call `span.end()` when done.
+    """
+    parent = _current_span.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+    parent_id = parent.span_id if parent is not None and parent.trace_id == trace_id else None
+    return Span(name, trace_id, parent_id, **attrs)
+
+
+@contextmanager
+def span(name, trace_id=None, **attrs):
+    """Time a block as a span nested under the current one.
+
+    Args:
+        name: Span name, e.g. "run_research" or "triage"
+        trace_id: Groups spans of one conversation or task; inherited from the
+            current span when omitted
+        **attrs: Extra attributes exported with the span
+    """
+    current = start_span(name, trace_id, **attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def current_span():
+    return _current_span.get()
+
+
+def _record(finished):
+    record = finished.to_dict()
+    with _lock:
+        spans = _traces.get(finished.trace_id)
+        if spans is None:
+            spans = _traces[finished.trace_id] = []
+            while len(_traces) > MAX_TRACES:
+                _traces.popitem(last=False)
+        else:
+            _traces.move_to_end(finished.trace_id)
+        spans.append(record)
+        del spans[:-MAX_SPANS_PER_TRACE]
+
+        if record.get("kind") == "llm":
+            stage = re.sub(r"\[\d+\]$", "", finished.name)
+            _metrics[("llm_calls_total", stage)] += 1
+            _metrics[("llm_latency_seconds_sum", stage)] += finished.duration
+            _metrics[("llm_prompt_tokens_total", stage)] += record.get("prompt_tokens") or 0
+            _metrics[("llm_output_tokens_total", stage)] += record.get("output_tokens") or 0
+            _metrics[("llm_cache_hits_total", stage)] += 1 if record.get("cache_hit") else 0
+            _metrics[("llm_retries_total", stage)] += record.get("retries") or 0
+            _metrics[("llm_errors_total", stage)] += 1 if record.get("error") else 0
+        elif record.get("kind") == "route":
+            route = record["route"]
+            _metrics[("route_calls_total", route)] += 1
+            _metrics[("route_escalations_total", route)] += record.get("escalations") or 0
+            _metrics[("route_slo_breaches_total", route)] += 0 if record.get("slo_met") else 1
+
+    if not _configured:
+        _configure()
+    if _logger.handlers:
+        _logger.info(json.dumps(record, default=str))
+
+
+def trace_spans(trace_id):
+    """All recorded spans of a trace, oldest first."""
+    with _lock:
+        return list(_traces.get(trace_id, []))
+
+
+def last_run(trace_id):
+    """Spans of the most recent root span in a trace, with offsets relative to its start.
+
+    Returns:
+        List of span dicts with added `offset` and `depth`, in start order
+    """
+    spans = trace_spans(trace_id)
+    roots = [s for s in spans if s["parent_id"] is None]
+    if not roots:
+        return []
+    root = max(roots, key=lambda s: s["start"])
+    children = defaultdict(list)
+    for s in spans:
+        if s["parent_id"] is not None:
+            children[s["parent_id"]].append(s)
+
+    run = []
+
+    def walk(node, depth):
+        run.append({**node, "offset": node["start"] - root["start"], "depth": depth})
+        for child in sorted(children[node["span_id"]], key=lambda s: s["start"]):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return run
+
+
+def prometheus_text():
+    """Aggregated model-call metrics in the Prometheus text exposition format."""
+    with _lock:
+        items = sorted(_metrics.items())
+    lines = []
+    seen = set()
+    for (metric, stage), value in items:
+        name = f"agentic_{metric}"
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f'{name}{{stage="{stage}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port):
+    """Serve /metrics on a background thread. Returns the server, or None if the port is taken."""
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+_configured = False
+
+
+def _configure():
+    # Runs once per process, when the first span finishes, so importing this module writes nothing
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+    path = os.environ.get("TRACE_PATH", os.path.join("logs", "traces.jsonl"))
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=int(os.environ.get("TRACE_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.environ.get("TRACE_BACKUPS", "5")),
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+    if os.environ.get("TRACE_METRICS_PORT"):
+        start_metrics_server(int(os.environ["TRACE_METRICS_PORT"]))